@@ -121,10 +121,11 @@ def run_forensic_analysis(db_path: str):
         # 8. Densité RGPD par dossier (Heatmap)
         # On suppose que rgpd_score_file a été peuplé (sinon 0 par défaut)
         query_gdpr = """
-            SELECT fo.path as folder_path, SUM(f.rgpd_score_file) as total_risk_score, COUNT(f.id) as file_count
+            SELECT fo.path as folder_path, SUM(s.rgpd_score_file) as total_risk_score, COUNT(f.id) as file_count
             FROM file f
+            JOIN file_scores s ON s.file_id = f.id
             JOIN folder fo ON f.folder_id = fo.id
-            WHERE f.rgpd_score_file > 0
+            WHERE s.rgpd_score_file > 0
             GROUP BY fo.id
             ORDER BY total_risk_score DESC
             LIMIT 20
@@ -156,7 +156,7 @@ def extract_archive_metadata_from_path(path: str) -> Dict[str, Any]:
 # --- POPULATE DATABASE ---
 # -------------------------
 
-def populate_archive_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+def populate_archive_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
     """
     Lit le chemin du fichier dans la table 'file',
     extrait les métadonnées Archive, et insère/met à jour :
@@ -218,4 +218,5 @@ def populate_archive_metadata(conn: sqlite3.Connection, file_id: int) -> None:
         (meta["mime_detected"], file_id),
     )
 
-    conn.commit()
\ No newline at end of file
+    if commit:
+        conn.commit()
@@ -234,7 +234,7 @@ def extract_audio_metadata_from_path(path: str) -> dict:
 # --- POPULATE DATABASE ---
 # -------------------------
 
-def populate_audio_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+def populate_audio_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
     """
     Lit le chemin du fichier dans la table 'file',
     extrait les métadonnées audio, et insère/met à jour :
@@ -344,4 +344,5 @@ def populate_audio_metadata(conn: sqlite3.Connection, file_id: int) -> None:
             (meta["mime_detected"], file_id),
         )
 
-    conn.commit()
\ No newline at end of file
+    if commit:
+        conn.commit()
@@ -279,7 +279,7 @@ def extract_3d_metadata_from_path(path: str) -> Dict[str, Any]:
 # --- POPULATE DATABASE ---
 # -------------------------
 
-def populate_3d_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+def populate_3d_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
     """
     Lit le chemin du fichier dans la table 'file',
     extrait les métadonnées 3D, et insère/met à jour :
@@ -344,4 +344,5 @@ def populate_3d_metadata(conn: sqlite3.Connection, file_id: int) -> None:
         (meta["mime_detected"], file_id),
     )
 
-    conn.commit()
\ No newline at end of file
+    if commit:
+        conn.commit()
@@ -184,7 +184,7 @@ def extract_exe_metadata_from_path(path: str) -> Dict[str, Any]:
 # --- POPULATE DATABASE ---
 # -------------------------
 
-def populate_exe_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+def populate_exe_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
     """
     Lit le chemin du fichier dans la table 'file',
     extrait les métadonnées EXE, et insère/met à jour :
@@ -253,4 +253,5 @@ def populate_exe_metadata(conn: sqlite3.Connection, file_id: int) -> None:
         (meta["mime_detected"], file_id),
     )
 
-    conn.commit()
\ No newline at end of file
+    if commit:
+        conn.commit()
@@ -297,7 +297,7 @@ def extract_image_metadata_from_path(path: str) -> dict:
 # --- POPULATE DATABASE ---
 # -------------------------
 
-def populate_image_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+def populate_image_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
     """
     Lit le chemin du fichier dans la table 'file',
     extrait les métadonnées image, et met à jour :
@@ -402,4 +402,5 @@ def populate_image_metadata(conn: sqlite3.Connection, file_id: int) -> None:
         (meta["mime_detected"], file_id),
     )
 
-    conn.commit()
+    if commit:
+        conn.commit()
@@ -208,7 +208,7 @@ def extract_disk_image_metadata_from_path(path: str) -> Dict[str, Any]:
 # --- POPULATE DATABASE ---
 # -------------------------
 
-def populate_disk_image_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+def populate_disk_image_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
     """
     Lit le chemin du fichier dans la table 'file',
     extrait les métadonnées Disk Image, et insère/met à jour :
@@ -272,4 +272,5 @@ def populate_disk_image_metadata(conn: sqlite3.Connection, file_id: int) -> None
         (meta["mime_detected"], file_id),
     )
 
-    conn.commit()
\ No newline at end of file
+    if commit:
+        conn.commit()
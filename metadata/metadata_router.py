@@ -143,7 +143,24 @@ IGNORED_FILES = {
     'record', 'wheel', 'metadata', 'installer', 'requested', 'description', 'exclude'
 }
 
-def dispatch_metadata_extraction(conn: sqlite3.Connection, file_id: int, extension: str) -> str:
+# Fréquence des commits en ingestion de masse (1 fsync tous les K fichiers
+# au lieu d'un par fichier)
+_COMMIT_EVERY = 128
+
+
+def configure_conn(conn: sqlite3.Connection) -> None:
+    """
+    Applique les PRAGMAs de performance pour l'ingestion en masse :
+    WAL + synchronous NORMAL regroupent les fsync aux checkpoints,
+    temp_store et cache_size limitent les allers-retours disque.
+    """
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA synchronous = NORMAL;")
+    conn.execute("PRAGMA temp_store = MEMORY;")
+    conn.execute("PRAGMA cache_size = -65536;")
+
+
+def dispatch_metadata_extraction(conn: sqlite3.Connection, file_id: int, extension: str, commit: bool = True) -> str:
     """
     Oriente vers le bon collecteur en fonction de l'extension (ou du nom de fichier passé comme extension).
     Retourne un statut (str).
@@ -156,7 +173,7 @@ def dispatch_metadata_extraction(conn: sqlite3.Connection, file_id: int, extensi
 
     if populate_func:
         try:
-            populate_func(conn, file_id)
+            populate_func(conn, file_id, commit=commit)
             return f"SUCCESS ({populate_func.__module__})"
         except Exception as e:
             return f"ERROR: {e}"
@@ -178,6 +195,7 @@ def run_global_metadata_population(db_path: str, progress_callback=None):
     log_path = Path(db_path).parent / "metadata_scan_log.txt"
 
     conn = sqlite3.connect(db_path)
+    configure_conn(conn)
     cur = conn.cursor()
 
     # 1. Sélectionner les fichiers
@@ -227,7 +245,7 @@ def run_global_metadata_population(db_path: str, progress_callback=None):
                 # B. Vérification par nom exact (ex: Makefile, LICENSE)
                 elif low_filename in META_ROUTER:
                     # On passe le nom exact comme "extension" au dispatcher
-                    status = dispatch_metadata_extraction(conn, file_id, low_filename)
+                    status = dispatch_metadata_extraction(conn, file_id, low_filename, commit=False)
 
                 # C. Vérification standard par extension
                 else:
@@ -240,7 +258,7 @@ def run_global_metadata_population(db_path: str, progress_callback=None):
                         if not target_ext.startswith('.'):
                             target_ext = '.' + target_ext
                     
-                    status = dispatch_metadata_extraction(conn, file_id, target_ext)
+                    status = dispatch_metadata_extraction(conn, file_id, target_ext, commit=False)
 
                 # --- Mise à jour des compteurs ---
                 if status.startswith("SUCCESS"):
@@ -261,10 +279,17 @@ def run_global_metadata_population(db_path: str, progress_callback=None):
                 # Pour s'assurer que le log s'écrit en temps réel
                 log_file.flush()
 
+                # Commit groupé plutôt qu'un fsync par fichier
+                if i % _COMMIT_EVERY == 0:
+                    conn.commit()
+
                 # Callback UI
                 if progress_callback:
                     progress_callback(i, total, filename, status)
-            
+
+            # Commit final du reliquat
+            conn.commit()
+
             log_file.write("-" * 50 + "\n")
             log_file.write(f"--- END SCAN: {datetime.now()} ---\n")
             
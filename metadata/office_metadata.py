@@ -158,7 +158,7 @@ def extract_office_metadata_from_path(path):
     result.update(extracted)
     return result
 
-def populate_office_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+def populate_office_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
     """
     Récupère le chemin, extrait les infos et remplit la table file_office_metadata.
     """
@@ -210,4 +210,5 @@ def populate_office_metadata(conn: sqlite3.Connection, file_id: int) -> None:
         meta['application_name']
     ))
     
-    conn.commit()
\ No newline at end of file
+    if commit:
+        conn.commit()
@@ -207,7 +207,7 @@ def extract_pdf_metadata_from_path(path: str) -> Dict[str, Any]:
 # --- POPULATE DATABASE ---
 # -------------------------
 
-def populate_pdf_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+def populate_pdf_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
     """
     Lit le chemin du fichier dans la table 'file',
     extrait les métadonnées PDF, et insère/met à jour :
@@ -303,4 +303,5 @@ def populate_pdf_metadata(conn: sqlite3.Connection, file_id: int) -> None:
         (meta["mime_detected"], file_id),
     )
 
-    conn.commit()
\ No newline at end of file
+    if commit:
+        conn.commit()
@@ -63,81 +63,239 @@ def _detect_language(path: str) -> str:
     ext = os.path.splitext(path)[1].lower()
     return EXT_TO_LANG.get(ext, 'Unknown')
 
+# Budget de scan regex : au-delà, on extrapole depuis le préfixe
+# (les comptes sont déjà approximatifs, cf. docstring de _count_structures)
+_SCAN_CAP = 4 * 1024 * 1024
+
+# Budget de l'analyse ligne à ligne pour les fichiers énormes (bundles générés...)
+_LINE_SCAN_CAP = 64 * 1024 * 1024
+
+# Regex précompilées une fois au chargement du module
+_TODO_RE = re.compile(r'\b(TODO|FIXME|XXX)\b', re.IGNORECASE)
+_PY_CLASS_RE = re.compile(r'^\s*class\s+\w+', re.MULTILINE)
+# (?:async\s+)? : même comptage que la passe fusionnée, qui reconnaît
+# les 'async def' — sans quoi le function_count d'un même source
+# différerait selon qu'il passe au-dessus ou en dessous de _SCAN_CAP
+_PY_DEF_RE = re.compile(r'^\s*(?:async\s+)?def\s+\w+', re.MULTILINE)
+# Regex générique pour "class Name"
+_GEN_CLASS_RE = re.compile(r'\bclass\s+\w+')
+# Regex très approximative pour "functionName(...)" ou "function name(...)"
+# C'est dur à faire parfaitement en regex pure, mais ça donne une idée de la complexité
+_GEN_FUNC_RE = re.compile(r'\b(function\s+\w+|\w+\s*\(.*\)\s*\{)')
+
+
+def _struct_py(content: str) -> Tuple[int, int]:
+    return len(_PY_CLASS_RE.findall(content)), len(_PY_DEF_RE.findall(content))
+
+
+def _struct_cfamily(content: str) -> Tuple[int, int]:
+    return len(_GEN_CLASS_RE.findall(content)), len(_GEN_FUNC_RE.findall(content))
+
+
+# Dispatch O(1) langage -> compteur de structures spécialisé
+_STRUCT_HANDLERS = {
+    'Python': _struct_py,
+    'JavaScript': _struct_cfamily,
+    'TypeScript': _struct_cfamily,
+    'Java': _struct_cfamily,
+    'C++': _struct_cfamily,
+    'C#': _struct_cfamily,
+    'PHP': _struct_cfamily,
+    'Go': _struct_cfamily,
+    'Rust': _struct_cfamily,
+    'C': _struct_cfamily,
+}
+
+
 def _count_structures(content: str, language: str) -> Tuple[int, int, int]:
     """
     Compte approximativement les Classes, Fonctions et TODOs via Regex.
     Retourne (class_count, function_count, todo_count).
     """
-    classes = 0
-    functions = 0
-    todos = len(re.findall(r'\b(TODO|FIXME|XXX)\b', content, re.IGNORECASE))
+    # Cap du scan : sur un bundle de 100 Mo, scanner tout le contenu pour
+    # des comptes approximatifs n'apporte rien. On extrapole depuis le préfixe.
+    if len(content) > _SCAN_CAP:
+        scale = len(content) / _SCAN_CAP
+        content = content[:_SCAN_CAP]
+    else:
+        scale = 1.0
 
-    if language in ['Python']:
-        classes = len(re.findall(r'^\s*class\s+\w+', content, re.MULTILINE))
-        functions = len(re.findall(r'^\s*def\s+\w+', content, re.MULTILINE))
-    
-    elif language in ['JavaScript', 'TypeScript', 'Java', 'C++', 'C#', 'PHP', 'Go', 'Rust', 'C']:
-        # Regex générique pour "class Name"
-        classes = len(re.findall(r'\bclass\s+\w+', content))
-        # Regex très approximative pour "functionName(...)" ou "function name(...)"
-        # C'est dur à faire parfaitement en regex pure, mais ça donne une idée de la complexité
-        functions = len(re.findall(r'\b(function\s+\w+|\w+\s*\(.*\)\s*\{)', content))
+    handler = _STRUCT_HANDLERS.get(language)
+    if handler:
+        classes, functions = handler(content)
+    else:
+        classes, functions = 0, 0
+
+    todos = len(_TODO_RE.findall(content))
+
+    if scale != 1.0:
+        classes = round(classes * scale)
+        functions = round(functions * scale)
+        todos = round(todos * scale)
 
     return classes, functions, todos
 
+def _scan_none(content: str) -> Tuple[int, int, int, int]:
+    """Langage sans syntaxe de commentaire connue : tout est code sauf le vide."""
+    lines = content.splitlines()
+    total = len(lines)
+    blank = 0
+    for line in lines:
+        if not line.strip():
+            blank += 1
+    return total, total - blank, 0, blank
+
+
+def _scan_single(content: str, single: str) -> Tuple[int, int, int, int]:
+    """Boucle spécialisée : commentaires mono-ligne uniquement (Shell, YAML...)."""
+    lines = content.splitlines()
+    total = len(lines)
+    blank = 0
+    comment = 0
+    code = 0
+
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            blank += 1
+        elif stripped.startswith(single):
+            comment += 1
+        else:
+            code += 1
+
+    return total, code, comment, blank
+
+
+def _scan_multi(content: str, single: str, multi_start: str, multi_end: str) -> Tuple[int, int, int, int]:
+    """Boucle spécialisée : commentaires mono-ligne + blocs multi-lignes."""
+    lines = content.splitlines()
+    total = len(lines)
+    blank = 0
+    comment = 0
+    code = 0
+
+    in_multiline = False
+
+    for line in lines:
+        stripped = line.strip()
+
+        if not stripped:
+            blank += 1
+            continue
+
+        # Gestion multi-lignes
+        if in_multiline:
+            comment += 1
+            if multi_end in stripped:
+                in_multiline = False
+            continue
+        if multi_start in stripped:
+            # Cas simple: le bloc commence ici
+            # Attention: il peut commencer et finir sur la même ligne
+            if multi_end in stripped and stripped.index(multi_end) > stripped.index(multi_start):
+                comment += 1  # Tout sur la même ligne
+            else:
+                comment += 1
+                in_multiline = True
+            continue
+
+        # Gestion ligne simple
+        if stripped.startswith(single):
+            comment += 1
+        else:
+            code += 1
+
+    return total, code, comment, blank
+
+
 def _analyze_lines(content: str, language: str) -> Tuple[int, int, int, int]:
     """
     Analyse ligne par ligne.
     Retourne (total, code, comment, blank).
+
+    La décision de syntaxe est prise UNE fois par fichier : on dispatch
+    vers une boucle interne spécialisée plutôt que de re-tester le tuple
+    de syntaxe à chaque ligne.
+    """
+    syntax = COMMENT_SYNTAX.get(language)
+    if syntax is None:
+        return _scan_none(content)
+
+    single, multi_start, multi_end = syntax
+    if multi_start and multi_end:
+        return _scan_multi(content, single, multi_start, multi_end)
+    return _scan_single(content, single)
+
+def _scan_all_python(content: str) -> Tuple[int, int, int, int, int, int]:
+    """
+    Passe fusionnée pour Python : classification des lignes ET comptage
+    class/def dans la même boucle (les motifs sont ancrés en début de
+    ligne, donc détectables sur la ligne strippée). Évite deux parcours
+    regex complets du contenu.
+    Retourne (total, code, comment, blank, classes, functions).
     """
     lines = content.splitlines()
     total = len(lines)
     blank = 0
     comment = 0
     code = 0
-    
-    syntax = COMMENT_SYNTAX.get(language)
-    
+    classes = 0
+    functions = 0
+
     in_multiline = False
-    
+
     for line in lines:
         stripped = line.strip()
-        
+
         if not stripped:
             blank += 1
             continue
-            
-        if not syntax:
-            # Si pas de syntaxe connue, on considère tout comme du code (sauf vide)
-            code += 1
+
+        if in_multiline:
+            comment += 1
+            if '"""' in stripped:
+                in_multiline = False
             continue
-            
-        single, multi_start, multi_end = syntax
-        
-        # Gestion multi-lignes
-        if multi_start and multi_end:
-            if in_multiline:
+        if '"""' in stripped:
+            if stripped.count('"""') >= 2:
+                comment += 1  # Ouvre et ferme sur la même ligne
+            else:
                 comment += 1
-                if multi_end in stripped:
-                    in_multiline = False
-                continue
-            elif multi_start in stripped:
-                # Cas simple: le bloc commence ici
-                # Attention: il peut commencer et finir sur la même ligne
-                if multi_end in stripped and stripped.index(multi_end) > stripped.index(multi_start):
-                    comment += 1 # Tout sur la même ligne
-                else:
-                    comment += 1
-                    in_multiline = True
-                continue
-        
-        # Gestion ligne simple
-        if single and stripped.startswith(single):
+                in_multiline = True
+            continue
+
+        if stripped.startswith('#'):
             comment += 1
-        else:
-            code += 1
-            
-    return total, code, comment, blank
+            continue
+
+        code += 1
+        if stripped.startswith(('class ', 'class\t')):
+            classes += 1
+        elif stripped.startswith(('def ', 'def\t', 'async def ')):
+            functions += 1
+
+    return total, code, comment, blank, classes, functions
+
+
+def _scan_all(content: str, language: str) -> Tuple[int, int, int, int, int, int, int]:
+    """
+    Point d'entrée unique de l'analyse : lignes + structures + TODOs.
+    Retourne (total, code, comment, blank, classes, functions, todos).
+
+    Pour Python (motifs ancrés ligne), tout est compté en une seule
+    boucle ; pour les autres langages, les regex restent appliquées sur
+    le contenu entier (boucles C, plus rapides qu'une passe Python par
+    ligne) via les chemins spécialisés existants.
+    """
+    if language == 'Python' and len(content) <= _SCAN_CAP:
+        total, code, cmt, blank, classes, functions = _scan_all_python(content)
+        todos = len(_TODO_RE.findall(content))
+        return total, code, cmt, blank, classes, functions, todos
+
+    total, code, cmt, blank = _analyze_lines(content, language)
+    classes, functions, todos = _count_structures(content, language)
+    return total, code, cmt, blank, classes, functions, todos
+
 
 # -------------------------
 # --- MAIN DATA EXTRACT ---
@@ -156,6 +314,7 @@ def extract_code_metadata_from_path(path: str) -> Dict[str, Any]:
         "class_count": 0,
         "function_count": 0,
         "todo_count": 0,
+        "counts_estimated": False,
         "mime_detected": "text/plain",
         "Exerpt_hund": None,
         "Exerpt_thou": None,
@@ -187,15 +346,21 @@ def extract_code_metadata_from_path(path: str) -> Dict[str, Any]:
         elif meta["language"] == 'HTML': meta["mime_detected"] = 'text/html'
         # ... autres mappings implicites ou on garde text/plain
 
-        # 2. Analyse des lignes (SLOC)
-        total, code, cmt, blank = _analyze_lines(content, meta["language"])
+        # 2+3. Analyse fusionnée : SLOC + structures en une passe
+        # Fichiers énormes : analyse bornée au budget puis extrapolation
+        if len(content) > _LINE_SCAN_CAP:
+            scale = len(content) / _LINE_SCAN_CAP
+            counts = _scan_all(content[:_LINE_SCAN_CAP], meta["language"])
+            total, code, cmt, blank, cls, fn, todos = (round(v * scale) for v in counts)
+            meta["counts_estimated"] = True
+        else:
+            total, code, cmt, blank, cls, fn, todos = _scan_all(content, meta["language"])
+            if len(content) > _SCAN_CAP:
+                meta["counts_estimated"] = True
         meta["lines_total"] = total
         meta["lines_code"] = code
         meta["lines_comment"] = cmt
         meta["lines_empty"] = blank
-
-        # 3. Analyse Structurelle (Regex)
-        cls, fn, todos = _count_structures(content, meta["language"])
         meta["class_count"] = cls
         meta["function_count"] = fn
         meta["todo_count"] = todos
@@ -215,7 +380,36 @@ def extract_code_metadata_from_path(path: str) -> Dict[str, Any]:
 # --- POPULATE DATABASE ---
 # -------------------------
 
-def populate_code_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+# SQL au niveau module : le cache de statements de sqlite3 est indexé sur
+# la string exacte, une constante garantit le hit (parse payé une fois)
+_INSERT_CODE_SQL = """
+    INSERT OR REPLACE INTO file_code_metadata (
+        file_id,
+        language,
+        lines_total,
+        lines_code,
+        lines_comment,
+        lines_empty,
+        class_count,
+        function_count,
+        todo_count,
+        Exerpt_hund,
+        Exerpt_thou,
+        Exerpt_full
+    ) VALUES (
+        ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    )
+"""
+
+_UPDATE_MIME_SQL = """
+    UPDATE file
+    SET mime_detected = ?,
+        updated_at    = datetime('now')
+    WHERE id = ?
+"""
+
+
+def populate_code_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
     """
     Lit le chemin du fichier dans la table 'file',
     extrait les métadonnées Code, et insère/met à jour :
@@ -239,24 +433,7 @@ def populate_code_metadata(conn: sqlite3.Connection, file_id: int) -> None:
     
     # Insertion
     cur.execute(
-        """
-        INSERT OR REPLACE INTO file_code_metadata (
-            file_id,
-            language,
-            lines_total,
-            lines_code,
-            lines_comment,
-            lines_empty,
-            class_count,
-            function_count,
-            todo_count,
-            Exerpt_hund,
-            Exerpt_thou,
-            Exerpt_full
-        ) VALUES (
-            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-        )
-        """,
+        _INSERT_CODE_SQL,
         (
             file_id,
             meta["language"],
@@ -274,14 +451,7 @@ def populate_code_metadata(conn: sqlite3.Connection, file_id: int) -> None:
     )
 
     # Mise à jour du MIME détecté
-    cur.execute(
-        """
-        UPDATE file
-        SET mime_detected = ?,
-            updated_at    = datetime('now')
-        WHERE id = ?
-        """,
-        (meta["mime_detected"], file_id),
-    )
+    cur.execute(_UPDATE_MIME_SQL, (meta["mime_detected"], file_id))
 
-    conn.commit()
\ No newline at end of file
+    if commit:
+        conn.commit()
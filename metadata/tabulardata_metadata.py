@@ -3,6 +3,7 @@ import sqlite3
 import os
 import csv
 import json
+import mmap
 from typing import Dict, Any, List, Optional
 
 # On tente d'utiliser Pandas pour la robustesse (Excel, Parquet, CSV complexes)
@@ -12,10 +13,130 @@ try:
 except ImportError:
     HAVE_PANDAS = False
 
+# Au-delà de cette taille, on passe par mmap plutôt que de charger
+# le fichier dans le tas Python (accès zéro-copie au cache de pages)
+_MMAP_THRESHOLD = 4 * 1024 * 1024
+
+# Au-delà de ce budget, le row_count CSV est estimé depuis le sample
+# (taille fichier / octets moyens par ligne) au lieu d'une relecture complète
+_ROW_COUNT_BUDGET = 8 * 1024 * 1024
+
 # ----------------------------
 # --- HELPERS ---
 # ----------------------------
 
+def _sniff_delim(sample: bytes) -> str:
+    """
+    Détection du délimiteur par fréquence d'octets sur les 10 premières
+    lignes : on retient le candidat dont le compte par ligne est à la fois
+    élevé et stable (variance faible). Un seul passage O(N) sur le sample,
+    là où csv.Sniffer re-parse plusieurs fois.
+    """
+    lines = [ln for ln in sample.split(b'\n')[:10] if ln]
+    best = b','
+    best_score = -1.0
+
+    for d in (b',', b';', b'\t', b'|'):
+        counts = [ln.count(d) for ln in lines]
+        if not counts:
+            continue
+        mean = sum(counts) / len(counts)
+        if mean < 1:
+            continue  # Candidat quasi absent
+        var = sum((c - mean) ** 2 for c in counts) / len(counts)
+        score = mean - var
+        if score > best_score:
+            best_score, best = score, d
+
+    return best.decode()
+
+
+def _guess_has_header(sample: bytes, delim: str) -> bool:
+    """
+    Heuristique header : la 1ère ligne est un header si aucun de ses
+    champs n'est purement numérique.
+    """
+    first = sample.split(b'\n', 1)[0].decode('utf-8', errors='replace')
+    fields = [f.strip().strip('"') for f in first.split(delim)]
+    if not fields:
+        return True
+    for f in fields:
+        try:
+            float(f)
+            return False
+        except ValueError:
+            continue
+    return True
+
+
+def _analyze_csv_mmap(path: str, stats: Dict[str, Any]) -> None:
+    """
+    Analyse CSV des gros fichiers via mmap : sniffing sur les 2 premiers Ko,
+    comptage de lignes par mm.count(b'\\n'), preview sur les 6 premières
+    lignes seulement. Le fichier n'est jamais dupliqué en mémoire.
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+
+            size = len(mm)
+            sample_bytes = bytes(mm[:2048])
+            delim = _sniff_delim(sample_bytes)
+            stats["delimiter"] = delim
+            has_header = _guess_has_header(sample_bytes, delim)
+
+            # Comptage des \n par tranches de 8 Mo (mmap n'a pas de .count)
+            row_count = 0
+            _CHUNK = 8 * 1024 * 1024
+            for off in range(0, size, _CHUNK):
+                row_count += mm[off:off + _CHUNK].count(b'\n')
+            # La dernière ligne peut ne pas finir par \n
+            if size and mm[size - 1:size] != b'\n':
+                row_count += 1
+            stats["row_count"] = row_count
+
+            # On ne décode que les 6 premières lignes pour la preview
+            raw_lines = []
+            pos = 0
+            for _ in range(6):
+                if pos >= size:
+                    break
+                nl = mm.find(b'\n', pos)
+                if nl == -1:
+                    raw_lines.append(bytes(mm[pos:min(pos + 65536, size)]))
+                    break
+                raw_lines.append(bytes(mm[pos:nl]))
+                pos = nl + 1
+
+    rows = list(csv.reader(
+        (ln.decode('utf-8', errors='replace') for ln in raw_lines),
+        delimiter=delim
+    ))
+
+    header_found = False
+    if rows:
+        stats["column_count"] = len(rows[0])
+        if has_header:
+            stats["columns_list"] = rows[0]
+            header_found = True
+        else:
+            stats["columns_list"] = [f"Col_{k+1}" for k in range(len(rows[0]))]
+
+    preview_lines = []
+    if header_found and rows:
+        preview_lines.append(" | ".join(map(str, stats["columns_list"])))
+        preview_lines.append("-" * 20)
+        start_idx = 1
+    else:
+        start_idx = 0
+
+    for r in rows[start_idx:]:
+        preview_lines.append(" | ".join(map(str, r)))
+
+    stats["preview_str"] = "\n".join(preview_lines)
+
+
 def _analyze_csv_fallback(path: str) -> Dict[str, Any]:
     """Analyse CSV légère avec la lib standard (si Pandas absent)."""
     stats = {
@@ -25,22 +146,21 @@ def _analyze_csv_fallback(path: str) -> Dict[str, Any]:
         "delimiter": ",",
         "preview_str": ""
     }
-    
+
     try:
-        # Sniffer le dialecte
+        # Gros fichier : analyse via mmap, sans relecture ligne à ligne
+        if os.path.getsize(path) >= _MMAP_THRESHOLD:
+            _analyze_csv_mmap(path, stats)
+            return stats
+        # Détection du délimiteur sur les 2 premiers Ko
+        with open(path, 'rb') as fb:
+            sample_bytes = fb.read(2048)
+        delim = _sniff_delim(sample_bytes)
+        stats["delimiter"] = delim
+        has_header = _guess_has_header(sample_bytes, delim)
+
         with open(path, 'r', encoding='utf-8', errors='replace') as f:
-            sample = f.read(2048)
-            f.seek(0)
-            try:
-                dialect = csv.Sniffer().sniff(sample)
-                stats["delimiter"] = dialect.delimiter
-                has_header = csv.Sniffer().has_header(sample)
-            except csv.Error:
-                # Fallback valeurs par défaut
-                dialect = csv.excel
-                has_header = True
-
-            reader = csv.reader(f, dialect)
+            reader = csv.reader(f, delimiter=delim)
             
             rows = []
             header_found = False
@@ -82,6 +202,19 @@ def _analyze_csv_fallback(path: str) -> Dict[str, Any]:
         
     return stats
 
+def _cheap_markdown(df) -> str:
+    """
+    Preview "markdown" minimaliste des 10 premières lignes, même mise en
+    page que _analyze_csv_fallback. Évite df.to_markdown (calcul de
+    largeurs de colonnes cellule par cellule + dépendance tabulate).
+    """
+    cols = list(map(str, df.columns))
+    rows = df.head(10).astype(str).values.tolist()
+    out = [" | ".join(cols), "-" * 20]
+    out.extend(" | ".join(r) for r in rows)
+    return "\n".join(out)
+
+
 def _analyze_with_pandas(path: str, ext: str) -> Dict[str, Any]:
     """Analyse robuste via Pandas (CSV, Excel, Parquet, JSON, etc.)."""
     stats = {
@@ -91,26 +224,34 @@ def _analyze_with_pandas(path: str, ext: str) -> Dict[str, Any]:
         "delimiter": None,
         "sheet_count": 0,
         "sheet_names": [],
-        "preview_str": ""
+        "preview_str": "",
+        "row_count_estimated": False
     }
-    
+
     df = None
     
     try:
         if ext == '.csv':
-            # Pandas détecte souvent bien le séparateur, sinon on peut utiliser 'python' engine
+            # Délimiteur détecté en amont : permet de rester sur le moteur C
+            # de pandas (sep=None forçait engine='python', bien plus lent)
             try:
-                df = pd.read_csv(path, sep=None, engine='python', nrows=1000) # On lit un sample pour les métadonnées rapides
-                # Pour le row_count total exact, il faut tout lire ou parser le fichier, 
-                # ici on lit tout si fichier < 100MB, sinon on estime ou on garde le sample?
-                # Pour être précis on va essayer de lire juste les métadonnées si possible.
-                # Relecture complète pour le count exact si pas trop gros
-                if os.path.getsize(path) < 50 * 1024 * 1024: # 50MB limit
-                    full_df = pd.read_csv(path, sep=None, engine='python', usecols=[0])
+                file_size = os.path.getsize(path)
+                with open(path, 'rb') as fb:
+                    sample_bytes = fb.read(min(file_size, 1024 * 1024))
+                stats["delimiter"] = _sniff_delim(sample_bytes[:2048])
+
+                df = pd.read_csv(path, sep=stats["delimiter"], nrows=1000) # On lit un sample pour les métadonnées rapides
+
+                if file_size <= _ROW_COUNT_BUDGET:
+                    # Petit fichier : relecture complète pour le count exact
+                    full_df = pd.read_csv(path, sep=stats["delimiter"], usecols=[0])
                     stats["row_count"] = len(full_df)
                 else:
-                    # Estimation ou bornée au sample
-                    stats["row_count"] = 1000 # Placeholder si trop gros
+                    # Gros fichier : estimation statistique depuis le sample,
+                    # évite de re-parser des millions de cellules pour une métadonnée
+                    avg_row_bytes = len(sample_bytes) / max(sample_bytes.count(b'\n'), 1)
+                    stats["row_count"] = max(int(file_size / avg_row_bytes) - 1, 0)  # -1 pour le header
+                    stats["row_count_estimated"] = True
             except:
                 pass
 
@@ -147,8 +288,8 @@ def _analyze_with_pandas(path: str, ext: str) -> Dict[str, Any]:
             stats["column_count"] = len(df.columns)
             stats["columns_list"] = list(df.columns.astype(str))
             
-            # Preview propre (Markdown grid)
-            stats["preview_str"] = df.head(10).to_markdown(index=False)
+            # Preview propre (format léger, sans to_markdown/tabulate)
+            stats["preview_str"] = _cheap_markdown(df)
             
             # Si row_count n'a pas été calculé totalement (Excel/Gros CSV)
             if stats["row_count"] == 0 and len(df) > 0:
@@ -205,10 +346,12 @@ def extract_tabulardata_metadata_from_path(path: str) -> Dict[str, Any]:
 
     # 2. Analyse Contenu
     preview_content = ""
-    
+    row_count_estimated = False
+
     if HAVE_PANDAS:
         p_stats = _analyze_with_pandas(path, ext)
         meta["row_count"] = p_stats["row_count"]
+        row_count_estimated = p_stats["row_count_estimated"]
         meta["column_count"] = p_stats["column_count"]
         meta["columns_names"] = ", ".join(p_stats["columns_list"])
         meta["sheet_count"] = p_stats["sheet_count"]
@@ -227,7 +370,9 @@ def extract_tabulardata_metadata_from_path(path: str) -> Dict[str, Any]:
 
     # 3. Construction des Extraits
     # Header summary
-    summary = f"FORMAT: {meta['format_type']}\nSHAPE: {meta['row_count']} rows x {meta['column_count']} cols\n"
+    # '~' signale un row_count estimé (gros fichiers, cf. _ROW_COUNT_BUDGET)
+    approx = "~" if row_count_estimated else ""
+    summary = f"FORMAT: {meta['format_type']}\nSHAPE: {approx}{meta['row_count']} rows x {meta['column_count']} cols\n"
     if meta["columns_names"]:
         summary += f"COLUMNS: {meta['columns_names']}\n"
     if meta["sheet_names"]:
@@ -248,7 +393,35 @@ def extract_tabulardata_metadata_from_path(path: str) -> Dict[str, Any]:
 # --- POPULATE DATABASE ---
 # -------------------------
 
-def populate_tabulardata_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+# SQL au niveau module : le cache de statements de sqlite3 est indexé sur
+# la string exacte, une constante garantit le hit (parse payé une fois)
+_INSERT_DATA_SQL = """
+    INSERT OR REPLACE INTO file_data_metadata (
+        file_id,
+        format_type,
+        row_count,
+        column_count,
+        columns_names,
+        delimiter,
+        sheet_count,
+        sheet_names,
+        Exerpt_hund,
+        Exerpt_thou,
+        Exerpt_full
+    ) VALUES (
+        ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    )
+"""
+
+_UPDATE_MIME_SQL = """
+    UPDATE file
+    SET mime_detected = ?,
+        updated_at    = datetime('now')
+    WHERE id = ?
+"""
+
+
+def populate_tabulardata_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
     """
     Lit le chemin du fichier dans la table 'file',
     extrait les métadonnées Data, et insère/met à jour :
@@ -272,23 +445,7 @@ def populate_tabulardata_metadata(conn: sqlite3.Connection, file_id: int) -> Non
     
     # Insertion
     cur.execute(
-        """
-        INSERT OR REPLACE INTO file_data_metadata (
-            file_id,
-            format_type,
-            row_count,
-            column_count,
-            columns_names,
-            delimiter,
-            sheet_count,
-            sheet_names,
-            Exerpt_hund,
-            Exerpt_thou,
-            Exerpt_full
-        ) VALUES (
-            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-        )
-        """,
+        _INSERT_DATA_SQL,
         (
             file_id,
             meta["format_type"],
@@ -305,14 +462,7 @@ def populate_tabulardata_metadata(conn: sqlite3.Connection, file_id: int) -> Non
     )
 
     # Mise à jour du MIME détecté
-    cur.execute(
-        """
-        UPDATE file
-        SET mime_detected = ?,
-            updated_at    = datetime('now')
-        WHERE id = ?
-        """,
-        (meta["mime_detected"], file_id),
-    )
+    cur.execute(_UPDATE_MIME_SQL, (meta["mime_detected"], file_id))
 
-    conn.commit()
\ No newline at end of file
+    if commit:
+        conn.commit()
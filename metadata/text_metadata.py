@@ -1,45 +1,62 @@
 import sqlite3
 import os
-from typing import Dict, Any, Optional
+import mmap
+from typing import Dict, Any, Optional, Tuple
+
+# Au-delà de cette taille, lecture via mmap (zéro-copie depuis le cache
+# de pages, une seule allocation pour la string finale)
+_MMAP_THRESHOLD = 4 * 1024 * 1024
 
 # ----------------------------
 # --- HELPERS ---
 # ----------------------------
 
-def _read_file_content(path: str) -> str:
+def _read_file_content(path: str) -> Tuple[str, str]:
     """
-    Tente de lire le contenu du fichier avec différents encodages.
-    Retourne le contenu en string.
+    Lit le fichier en binaire UNE seule fois puis essaie les décodages en
+    mémoire (au lieu d'une relecture texte par encodage candidat).
+    Retourne (contenu, encodage détecté).
     """
     encodings = ['utf-8', 'latin-1', 'cp1252', 'ascii']
-    
-    for enc in encodings:
+
+    # Gros fichier : on décode directement depuis la projection mmap,
+    # sans dupliquer les octets dans le tas Python
+    try:
+        large = os.path.getsize(path) >= _MMAP_THRESHOLD
+    except OSError:
+        large = False
+
+    if large:
         try:
-            with open(path, 'r', encoding=enc) as f:
-                return f.read()
-        except (UnicodeDecodeError, OSError):
-            continue
-            
-    # Si tout échoue, on tente en binaire avec errors='replace' pour récupérer ce qu'on peut
+            with open(path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    for enc in encodings:
+                        try:
+                            return str(memoryview(mm), enc), enc
+                        except UnicodeDecodeError:
+                            continue
+                    return str(memoryview(mm), 'utf-8', 'replace'), "unknown"
+        except (OSError, ValueError):
+            pass
+
+    # Lecture brute sans buffer intermédiaire : FileIO.readall() remplit
+    # un seul buffer à croissance exponentielle (pas de fragments de 8 Ko)
     try:
-        with open(path, 'rb') as f:
-            return f.read().decode('utf-8', errors='replace')
-    except Exception:
-        return ""
+        with open(path, 'rb', buffering=0) as f:
+            raw = f.readall()
+    except OSError:
+        return "", "unknown"
 
-def _detect_encoding(path: str) -> str:
-    """
-    Détection basique de l'encodage pour les métadonnées.
-    """
-    encodings = ['utf-8', 'latin-1', 'cp1252']
     for enc in encodings:
         try:
-            with open(path, 'r', encoding=enc) as f:
-                f.read()
-                return enc
-        except (UnicodeDecodeError, OSError):
+            return raw.decode(enc), enc
+        except UnicodeDecodeError:
             continue
-    return "unknown"
+
+    # Si tout échoue, errors='replace' pour récupérer ce qu'on peut
+    return raw.decode('utf-8', errors='replace'), "unknown"
 
 # -------------------------
 # --- MAIN DATA EXTRACT ---
@@ -64,12 +81,9 @@ def extract_text_metadata_from_path(path: str) -> Dict[str, Any]:
         return meta
 
     try:
-        # 1. Détection de l'encodage
-        detected_enc = _detect_encoding(path)
+        # 1. Lecture du contenu + détection d'encodage en une seule passe
+        content, detected_enc = _read_file_content(path)
         meta["encoding"] = detected_enc
-
-        # 2. Lecture du contenu
-        content = _read_file_content(path)
         
         if content:
             # Stats
@@ -109,7 +123,32 @@ def extract_text_metadata_from_path(path: str) -> Dict[str, Any]:
 # --- POPULATE DATABASE ---
 # -------------------------
 
-def populate_text_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+# SQL au niveau module : le cache de statements de sqlite3 est indexé sur
+# la string exacte, une constante garantit le hit (parse payé une fois)
+_INSERT_TEXT_SQL = """
+    INSERT OR REPLACE INTO file_text_metadata (
+        file_id,
+        line_count,
+        word_count,
+        char_count,
+        encoding,
+        Exerpt_hund,
+        Exerpt_thou,
+        Exerpt_full
+    ) VALUES (
+        ?, ?, ?, ?, ?, ?, ?, ?
+    )
+"""
+
+_UPDATE_MIME_SQL = """
+    UPDATE file
+    SET mime_detected = ?,
+        last_update   = datetime('now')
+    WHERE id = ?
+"""
+
+
+def populate_text_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
     """
     Lit le chemin du fichier dans la table 'file',
     extrait les métadonnées texte, et insère/met à jour :
@@ -132,20 +171,7 @@ def populate_text_metadata(conn: sqlite3.Connection, file_id: int) -> None:
     meta = extract_text_metadata_from_path(path)
     
     cur.execute(
-        """
-        INSERT OR REPLACE INTO file_text_metadata (
-            file_id,
-            line_count,
-            word_count,
-            char_count,
-            encoding,
-            Exerpt_hund,
-            Exerpt_thou,
-            Exerpt_full
-        ) VALUES (
-            ?, ?, ?, ?, ?, ?, ?, ?
-        )
-        """,
+        _INSERT_TEXT_SQL,
         (
             file_id,
             meta["line_count"],
@@ -159,14 +185,7 @@ def populate_text_metadata(conn: sqlite3.Connection, file_id: int) -> None:
     )
 
     # Mise à jour du MIME détecté
-    cur.execute(
-        """
-        UPDATE file
-        SET mime_detected = ?,
-            last_update   = datetime('now')  -- <--- REMPLACER 'updated_at' PAR 'last_update'
-        WHERE id = ?
-        """,
-        (meta["mime_detected"], file_id),
-    )
+    cur.execute(_UPDATE_MIME_SQL, (meta["mime_detected"], file_id))
 
-    conn.commit()
\ No newline at end of file
+    if commit:
+        conn.commit()
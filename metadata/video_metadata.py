@@ -4,12 +4,34 @@ import subprocess
 import json
 import shutil
 import os
+import asyncio
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 # Vérification de la présence de ffprobe au chargement du module
 FFPROBE_BIN = shutil.which("ffprobe")
 
+# Extraction in-process via PyAV (bindings libavformat) si installé :
+# évite le fork/exec + aller-retour JSON d'ffprobe pour chaque fichier
+# (coût fixe ~50ms ramené à ~2ms, décisif sur les petits fichiers)
+try:
+    import av  # type: ignore
+    HAVE_AV = True
+except ImportError:
+    HAVE_AV = False
+
+# Parseur JSON le plus rapide disponible : orjson (~3-5x stdlib) puis
+# simdjson (~10x) en option, stdlib en secours. Tous acceptent des bytes.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    try:
+        import simdjson
+        _json_loads = simdjson.loads
+    except ImportError:
+        _json_loads = json.loads
+
 # ----------------------------
 # --- HELPERS ---
 # ----------------------------
@@ -31,6 +53,29 @@ def _parse_frame_rate(r_frame_rate: str) -> Optional[float]:
         pass
     return None
 
+# ffprobe/libavformat renvoient des noms de format en tokens séparés par
+# des virgules (ex: "mov,mp4,m4a,3gp,3g2,mj2" pour TOUT fichier de la
+# famille QuickTime/MP4, .mp4 compris). L'itération suit NOTRE ordre de
+# préférence, pas l'ordre des tokens du fichier : "mov" arrive en tête
+# côté ffprobe et étiquetterait chaque MP4 en video/quicktime.
+_FMT_MIME = {
+    "mp4": "video/mp4",
+    "matroska": "video/x-matroska",
+    "webm": "video/webm",
+    "avi": "video/x-msvideo",
+    "mov": "video/quicktime",
+}
+
+
+def _mime_from_format(fmt_name: str) -> Optional[str]:
+    """Déduit le MIME depuis le format_name (tokens ffprobe), sinon None."""
+    tokens = set(fmt_name.lower().split(","))
+    for fmt, mime in _FMT_MIME.items():
+        if fmt in tokens:
+            return mime
+    return None
+
+
 def _get_codec_name(stream: dict) -> str:
     """Récupère le nom lisible du codec."""
     # Parfois 'codec_name' est technique (h264), 'codec_long_name' est verbeux
@@ -48,12 +93,9 @@ def _get_codec_name(stream: dict) -> str:
 # --- MAIN DATA EXTRACT ---
 # -------------------------
 
-def extract_video_metadata_from_path(path: str) -> Dict[str, Any]:
-    """
-    Extrait les métadonnées vidéo via ffprobe (JSON output).
-    Retourne un dictionnaire prêt pour l'insertion SQL.
-    """
-    metadata = {
+def _empty_metadata() -> Dict[str, Any]:
+    """Dictionnaire de métadonnées vide, prêt pour l'insertion SQL."""
+    return {
         "width": None,
         "height": None,
         "duration_sec": None,
@@ -65,71 +107,143 @@ def extract_video_metadata_from_path(path: str) -> Dict[str, Any]:
         "mime_detected": None # Pour mise à jour table file
     }
 
+
+# Champs effectivement lus par _parse_ffprobe_output : sans ce filtre,
+# ffprobe sort aussi tags, dispositions, side_data... (~10x plus de JSON
+# à écrire côté ffprobe puis à décoder côté Python)
+_FFPROBE_ENTRIES = (
+    "format=format_name,format_long_name,duration,bit_rate"
+    ":stream=codec_type,codec_name,profile,width,height,"
+    "r_frame_rate,avg_frame_rate"
+)
+
+
+def _ffprobe_cmd(path: str) -> List[str]:
+    """
+    Commande ffprobe pour sortir un JSON propre.
+    -v error : mode silencieux
+    -show_entries : uniquement les champs format/stream qu'on lit
+    -probesize / -analyzeduration : borne le travail de sondage de ffprobe
+    """
+    return [
+        FFPROBE_BIN,
+        "-v", "error",
+        "-print_format", "json",
+        "-probesize", "500k",
+        "-analyzeduration", "500k",
+        "-show_entries", _FFPROBE_ENTRIES,
+        path
+    ]
+
+
+def _parse_ffprobe_output(data: dict, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Remplit `metadata` depuis le JSON ffprobe décodé."""
+    # 1. Container info (Format)
+    fmt = data.get("format", {})
+    metadata["container_format"] = fmt.get("format_long_name", fmt.get("format_name"))
+
+    dur = fmt.get("duration")
+    if dur:
+        metadata["duration_sec"] = float(dur)
+
+    br = fmt.get("bit_rate")
+    if br:
+        metadata["bitrate_kbps"] = int(br) / 1000.0
+
+    # Mime fallback via format name si possible
+    metadata["mime_detected"] = _mime_from_format(fmt.get("format_name", ""))
+
+    # 2. Streams info
+    streams = data.get("streams", [])
+
+    video_stream = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio_stream = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    if video_stream:
+        metadata["width"] = video_stream.get("width")
+        metadata["height"] = video_stream.get("height")
+        metadata["video_codec"] = _get_codec_name(video_stream)
+
+        # Framerate
+        fps = video_stream.get("r_frame_rate") # "30/1"
+        # Fallback avg_frame_rate si r_frame_rate est bizarre
+        if fps == "0/0": fps = video_stream.get("avg_frame_rate")
+
+        metadata["frame_rate"] = _parse_frame_rate(fps)
+
+    if audio_stream:
+        metadata["audio_codec"] = _get_codec_name(audio_stream)
+
+    return metadata
+
+
+def _extract_with_av(path: str, metadata: Dict[str, Any]) -> bool:
+    """
+    Remplit `metadata` via libavformat (PyAV), sans sous-processus.
+    Retourne False en cas d'échec — l'appelant retombe alors sur ffprobe.
+    """
+    try:
+        with av.open(path, metadata_errors="ignore") as container:
+            fmt = container.format
+            metadata["container_format"] = fmt.long_name or fmt.name
+            if container.duration is not None:
+                metadata["duration_sec"] = container.duration / av.time_base
+            if container.bit_rate:
+                metadata["bitrate_kbps"] = container.bit_rate / 1000.0
+
+            # Même logique MIME que le chemin ffprobe
+            metadata["mime_detected"] = _mime_from_format(fmt.name or "")
+
+            video = next((s for s in container.streams if s.type == "video"), None)
+            audio = next((s for s in container.streams if s.type == "audio"), None)
+
+            if video is not None:
+                cc = video.codec_context
+                metadata["width"] = cc.width
+                metadata["height"] = cc.height
+                metadata["video_codec"] = _get_codec_name(
+                    {"codec_name": cc.name, "profile": cc.profile}
+                )
+                if video.average_rate:
+                    metadata["frame_rate"] = float(video.average_rate)
+
+            if audio is not None:
+                metadata["audio_codec"] = _get_codec_name(
+                    {"codec_name": audio.codec_context.name}
+                )
+        return True
+    except Exception as e:
+        print(f"Erreur PyAV sur {path} ({e}), repli sur ffprobe.")
+        return False
+
+
+def extract_video_metadata_from_path(path: str) -> Dict[str, Any]:
+    """
+    Extrait les métadonnées vidéo via PyAV (in-process) quand il est
+    disponible, sinon via ffprobe (JSON output).
+    Retourne un dictionnaire prêt pour l'insertion SQL.
+    """
+    metadata = _empty_metadata()
+
+    if HAVE_AV and _extract_with_av(path, metadata):
+        return metadata
+
     if not FFPROBE_BIN:
         print(f"ATTENTION: 'ffprobe' introuvable. Impossible de scanner la vidéo : {path}")
         return metadata
 
     try:
-        # Commande ffprobe pour sortir un JSON propre
-        # -v error : mode silencieux
-        # -show_format : conteneur, durée, bitrate global
-        # -show_streams : détails vidéo/audio
-        cmd = [
-            FFPROBE_BIN,
-            "-v", "error",
-            "-print_format", "json",
-            "-show_format",
-            "-show_streams",
-            path
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
-        
+        # Pas de text=True : le JSON part en bytes directement dans le
+        # parseur (orjson/simdjson les prennent tels quels), sans passe
+        # de décodage utf-8 ni str intermédiaire
+        result = subprocess.run(_ffprobe_cmd(path), capture_output=True, timeout=15)
+
         if result.returncode != 0:
-            print(f"Erreur ffprobe sur {path}: {result.stderr}")
+            print(f"Erreur ffprobe sur {path}: {result.stderr.decode(errors='replace')}")
             return metadata
 
-        data = json.loads(result.stdout)
-        
-        # 1. Container info (Format)
-        fmt = data.get("format", {})
-        metadata["container_format"] = fmt.get("format_long_name", fmt.get("format_name"))
-        
-        dur = fmt.get("duration")
-        if dur:
-            metadata["duration_sec"] = float(dur)
-            
-        br = fmt.get("bit_rate")
-        if br:
-            metadata["bitrate_kbps"] = int(br) / 1000.0
-
-        # Mime fallback via format name si possible
-        fmt_name = fmt.get("format_name", "").lower()
-        if "mp4" in fmt_name: metadata["mime_detected"] = "video/mp4"
-        elif "matroska" in fmt_name: metadata["mime_detected"] = "video/x-matroska"
-        elif "avi" in fmt_name: metadata["mime_detected"] = "video/x-msvideo"
-        elif "webm" in fmt_name: metadata["mime_detected"] = "video/webm"
-
-        # 2. Streams info
-        streams = data.get("streams", [])
-        
-        video_stream = next((s for s in streams if s.get("codec_type") == "video"), None)
-        audio_stream = next((s for s in streams if s.get("codec_type") == "audio"), None)
-
-        if video_stream:
-            metadata["width"] = video_stream.get("width")
-            metadata["height"] = video_stream.get("height")
-            metadata["video_codec"] = _get_codec_name(video_stream)
-            
-            # Framerate
-            fps = video_stream.get("r_frame_rate") # "30/1"
-            # Fallback avg_frame_rate si r_frame_rate est bizarre
-            if fps == "0/0": fps = video_stream.get("avg_frame_rate")
-            
-            metadata["frame_rate"] = _parse_frame_rate(fps)
-
-        if audio_stream:
-            metadata["audio_codec"] = _get_codec_name(audio_stream)
+        data = _json_loads(result.stdout)
+        _parse_ffprobe_output(data, metadata)
 
     except Exception as e:
         print(f"Exception lors du scan vidéo {path}: {e}")
@@ -138,54 +252,113 @@ def extract_video_metadata_from_path(path: str) -> Dict[str, Any]:
 
 
 # -------------------------
-# --- POPULATE DATABASE ---
+# --- BULK EXTRACT (ASYNC) ---
 # -------------------------
 
-def populate_video_metadata(conn: sqlite3.Connection, file_id: int) -> None:
+async def _probe_one_async(path: str, sem: "asyncio.Semaphore") -> Dict[str, Any]:
+    """Sonde un fichier via un ffprobe asynchrone, borné par le sémaphore."""
+    metadata = _empty_metadata()
+    async with sem:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *_ffprobe_cmd(path),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            out, err = await asyncio.wait_for(proc.communicate(), timeout=15)
+        except TimeoutError:
+            # wait_for annule la tâche communicate() mais ne tue pas le
+            # processus : sans kill(), le ffprobe bloqué survivrait au scan
+            proc.kill()
+            await proc.wait()
+            print(f"Timeout ffprobe sur {path} (processus tué)")
+            return metadata
+        except Exception as e:
+            print(f"Exception lors du scan vidéo {path}: {e}")
+            return metadata
+
+    if proc.returncode != 0:
+        print(f"Erreur ffprobe sur {path}: {err.decode(errors='replace')}")
+        return metadata
+
+    try:
+        _parse_ffprobe_output(_json_loads(out), metadata)
+    except Exception as e:
+        print(f"Exception lors du scan vidéo {path}: {e}")
+
+    return metadata
+
+
+async def _probe_all_async(paths: List[str], concurrency: int) -> List[Dict[str, Any]]:
+    sem = asyncio.Semaphore(concurrency)
+    return list(await asyncio.gather(*(_probe_one_async(p, sem) for p in paths)))
+
+
+def extract_video_metadata_bulk(paths: List[str], concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
     """
-    Lit le chemin du fichier dans la table 'file',
-    extrait les métadonnées vidéo via ffprobe, et insère/met à jour :
-      - file_video_metadata
-      - file.mime_detected
-    pour le file_id donné.
+    Sonde un lot de vidéos avec N ffprobe en parallèle (N = nb de cœurs
+    par défaut). Sur un gros corpus, le coût fork+execve est recouvert
+    par la concurrence au lieu d'être payé en série.
+    Retourne les métadonnées dans l'ordre de `paths`.
     """
-    cur = conn.cursor()
+    if not paths:
+        return []
 
-    row = cur.execute(
-        "SELECT path FROM file WHERE id = ?",
-        (file_id,),
-    ).fetchone()
+    # Avec PyAV le coût par fichier est de l'ordre de la milliseconde :
+    # la boucle séquentielle in-process bat le lancement de N ffprobe
+    if HAVE_AV:
+        return [extract_video_metadata_from_path(p) for p in paths]
 
-    if row is None:
-        raise ValueError(f"Aucun fichier avec id={file_id}")
+    if not FFPROBE_BIN:
+        print("ATTENTION: 'ffprobe' introuvable. Impossible de scanner les vidéos.")
+        return [_empty_metadata() for _ in paths]
 
-    path = row[0]
+    workers = concurrency or os.cpu_count() or 1
+    return asyncio.run(_probe_all_async(paths, workers))
 
-    # Extraction
-    meta = extract_video_metadata_from_path(path)
-    
+
+# -------------------------
+# --- POPULATE DATABASE ---
+# -------------------------
+
+_INSERT_VIDEO_SQL = """
+    INSERT OR REPLACE INTO file_video_metadata (
+        file_id,
+        width,
+        height,
+        duration_sec,
+        video_codec,
+        audio_codec,
+        container_format,
+        frame_rate,
+        bitrate_kbps
+    ) VALUES (
+        ?, ?, ?, ?, ?, ?, ?, ?, ?
+    )
+"""
+
+_UPDATE_MIME_SQL = """
+    UPDATE file
+    SET mime_detected = ?,
+        updated_at    = datetime('now')
+    WHERE id = ? AND (mime_detected IS NULL OR mime_detected = 'application/octet-stream')
+"""
+
+
+def _insert_video_meta(cur: sqlite3.Cursor, file_id: int, meta: Dict[str, Any]) -> bool:
+    """
+    Insère les métadonnées d'un fichier (et met à jour le MIME si plus
+    précis que l'existant). Retourne False si le dict est vide (pas de
+    container ni de codec), auquel cas rien n'est écrit.
+    """
     # Si on n'a rien trouvé (pas de video stream ou erreur), on évite d'insérer du vide
     # sauf si on veut expliciter que c'est vide. Ici on insère si on a au moins un container ou codec.
     if not (meta["container_format"] or meta["video_codec"]):
-        return
+        return False
 
     # Insertion ou Remplacement
     cur.execute(
-        """
-        INSERT OR REPLACE INTO file_video_metadata (
-            file_id,
-            width,
-            height,
-            duration_sec,
-            video_codec,
-            audio_codec,
-            container_format,
-            frame_rate,
-            bitrate_kbps
-        ) VALUES (
-            ?, ?, ?, ?, ?, ?, ?, ?, ?
-        )
-        """,
+        _INSERT_VIDEO_SQL,
         (
             file_id,
             meta["width"],
@@ -201,14 +374,66 @@ def populate_video_metadata(conn: sqlite3.Connection, file_id: int) -> None:
 
     # Mise à jour du MIME si détecté et plus précis que l'existant
     if meta["mime_detected"]:
-        cur.execute(
-            """
-            UPDATE file
-            SET mime_detected = ?,
-                updated_at    = datetime('now')
-            WHERE id = ? AND (mime_detected IS NULL OR mime_detected = 'application/octet-stream')
-            """,
-            (meta["mime_detected"], file_id),
-        )
-
-    conn.commit()
\ No newline at end of file
+        cur.execute(_UPDATE_MIME_SQL, (meta["mime_detected"], file_id))
+
+    return True
+
+
+def populate_video_metadata(conn: sqlite3.Connection, file_id: int, commit: bool = True) -> None:
+    """
+    Lit le chemin du fichier dans la table 'file',
+    extrait les métadonnées vidéo via ffprobe, et insère/met à jour :
+      - file_video_metadata
+      - file.mime_detected
+    pour le file_id donné.
+
+    Pour un chargement en masse, passer commit=False et regrouper les
+    appels dans une transaction côté appelant (un commit pour N fichiers,
+    pas un fsync par fichier) — ou utiliser populate_video_metadata_bulk.
+    """
+    cur = conn.cursor()
+
+    row = cur.execute(
+        "SELECT path FROM file WHERE id = ?",
+        (file_id,),
+    ).fetchone()
+
+    if row is None:
+        raise ValueError(f"Aucun fichier avec id={file_id}")
+
+    path = row[0]
+
+    # Extraction
+    meta = extract_video_metadata_from_path(path)
+
+    if not _insert_video_meta(cur, file_id, meta):
+        return
+
+    if commit:
+        conn.commit()
+
+
+def populate_video_metadata_bulk(conn: sqlite3.Connection, file_ids: List[int]) -> None:
+    """
+    Variante batch : sonde tous les fichiers en parallèle (ffprobe async)
+    puis écrit le tout dans une seule transaction.
+    """
+    if not file_ids:
+        return
+
+    cur = conn.cursor()
+
+    paths = []
+    valid_ids = []
+    for file_id in file_ids:
+        row = cur.execute("SELECT path FROM file WHERE id = ?", (file_id,)).fetchone()
+        if row is not None:
+            valid_ids.append(file_id)
+            paths.append(row[0])
+
+    metas = extract_video_metadata_bulk(paths)
+
+    for file_id, meta in zip(valid_ids, metas):
+        _insert_video_meta(cur, file_id, meta)
+
+    conn.commit()
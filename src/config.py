@@ -1,7 +1,20 @@
+import os
 from pathlib import Path
 
-# Le fichier config.py se trouve dans src/, on remonte d'un niveau pour atteindre la racine du projet
-PROJECT_ROOT = Path(__file__).resolve().parent.parent
+# Le fichier config.py se trouve dans src/, on remonte d'un niveau pour
+# atteindre la racine du projet. LOCARD_ROOT permet de fixer la racine
+# sans résolution filesystem (et .resolve() — un realpath() par import —
+# n'est pas nécessaire : le chemin de __file__ est déjà absolu).
+_env_root = os.environ.get("LOCARD_ROOT")
+PROJECT_ROOT = Path(_env_root) if _env_root else Path(__file__).parent.parent
 
 # Chemins utiles
-DB_PATH = PROJECT_ROOT / "working_DB" / "project_index.db"
\ No newline at end of file
+DB_PATH = PROJECT_ROOT / "working_DB" / "project_index.db"
+
+# Algorithme de hachage du scan : "sha256" (défaut) ou "blake3" si le
+# paquet blake3 est installé (nettement plus rapide, SIMD + hachage en
+# arbre). L'algorithme actif est étiqueté dans la base (PRAGMA
+# user_version) : en cas de changement, le scan suivant ignore les hashs
+# stockés et re-hache tout au lieu de mélanger les deux formats (SHA-256
+# et BLAKE3 font tous deux 64 hexa, indistinguables a posteriori).
+HASH_ALGO = os.environ.get("LOCARD_HASH_ALGO", "sha256")
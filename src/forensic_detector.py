@@ -1,5 +1,7 @@
 import re
+import os
 import sqlite3
+import multiprocessing
 from pathlib import Path
 from typing import List, Dict, Tuple
 
@@ -9,7 +11,7 @@ from typing import List, Dict, Tuple
 
 REGEXES = {
     "donnees_personnelles": {
-        "pattern": re.compile(r"(Nom|Prénom|Date de naissance|Adresse|Ville|Département|Code postal|N° de dossier)\s*[:=]?\s*[\w\s\-\./,]{5,}", re.IGNORECASE),
+        "pattern": re.compile(r"(Nom|Prénom|Date de naissance|Adresse|Ville|Département|Code postal|N° de dossier)\s*[:=]?\s*[\w\s\-\./,]{5,120}+", re.IGNORECASE),
         "description": "Données personnelles (RGPD)"
     },
     "nss": {
@@ -29,7 +31,7 @@ REGEXES = {
         "description": "Email personnel/professionnel"
     },
     "mot_de_passe_cle_api": {
-        "pattern": re.compile(r"(pass|password|api[_-]?key|secret|token|access[_-]?key)\s*=\s*[\w\.\+\-]{8,}", re.IGNORECASE),
+        "pattern": re.compile(r"(pass|password|api[_-]?key|secret|token|access[_-]?key)\s*=\s*[\w\.\+\-]{8,128}+", re.IGNORECASE),
         "description": "Mot de passe ou clé API"
     },
     "carte_bancaire": {
@@ -49,19 +51,19 @@ REGEXES = {
         "description": "URL internes ou non sécurisées"
     },
     "localisation": {
-        "pattern": re.compile(r"(Lat|Latitude|Long|Longitude|Coordonnées|Adresse|Ville|Département|Code postal)\s*[:=]?\s*[\d\.\-\+]+", re.IGNORECASE),
+        "pattern": re.compile(r"(Lat|Latitude|Long|Longitude|Coordonnées|Adresse|Ville|Département|Code postal)\s*[:=]?\s*[\d\.\-\+]{1,64}+", re.IGNORECASE),
         "description": "Coordonnées géographiques"
     },
     "identifiants_machines": {
-        "pattern": re.compile(r"(MAC|UUID|Serial|Hostname|Machine|Computer)\s*[:=]?\s*([0-9a-fA-F:\-\.\s]{12,})", re.IGNORECASE),
+        "pattern": re.compile(r"(MAC|UUID|Serial|Hostname|Machine|Computer)\s*[:=]?\s*([0-9a-fA-F:\-\.\s]{12,64}+)", re.IGNORECASE),
         "description": "Identifiants de machines"
     },
     "utilisateurs_roles": {
-        "pattern": re.compile(r"(User|Utilisateur|Login|Username|Fonction|Role|Rôle)\s*[:=]?\s*([A-Za-z\s\-]{3,})", re.IGNORECASE),
+        "pattern": re.compile(r"(User|Utilisateur|Login|Username|Fonction|Role|Rôle)\s*[:=]?\s*([A-Za-z\s\-]{3,64}+)", re.IGNORECASE),
         "description": "Utilisateurs ou rôles"
     },
     "historique_fichiers": {
-        "pattern": re.compile(r"(modified|deleted|chmod|chown|mv|cp|rm|rename)\s+[/\w\.\-\s]+", re.IGNORECASE),
+        "pattern": re.compile(r"(modified|deleted|chmod|chown|mv|cp|rm|rename)\s+[/\w\.\-\s]{1,256}+", re.IGNORECASE),
         "description": "Historique de modification de fichiers"
     },
     "extensions_suspectes": {
@@ -75,112 +77,433 @@ REGEXES = {
 }
 
 # -------------------------------
-# 📥 FONCTION : Récupérer le texte d’un fichier
+# ⚡ COMPILATION : Alternation unique (1 passe au lieu de 16)
 # -------------------------------
-def get_file_text(conn: sqlite3.Connection, file_id: int) -> str:
-    """Récupère le texte (Exerpt_full) d’un fichier depuis la base."""
+
+# Descriptions accessibles par nom de catégorie (évite de retraverser REGEXES)
+DESCRIPTIONS = {name: config["description"] for name, config in REGEXES.items()}
+
+# Fusion des 16 patterns en une seule alternation nommée : le texte n'est
+# parcouru qu'une fois par finditer, au lieu d'un findall par catégorie.
+# Chaque alternative embarque son propre flag (?i:...) pour ne pas imposer
+# IGNORECASE aux patterns qui ne le demandent pas.
+def _build_combined():
+    parts = []
+    sub_groups = {}
+    for name, config in REGEXES.items():
+        pattern = config["pattern"]
+        wrapper = "(?i:" if pattern.flags & re.IGNORECASE else "(?:"
+        parts.append(f"(?P<{name}>{wrapper}{pattern.pattern}))")
+        sub_groups[name] = pattern.groups
+    return re.compile("|".join(parts)), sub_groups
+
+COMBINED, _SUB_GROUPS = _build_combined()
+
+# Moteur DFA linéaire (google-re2) si disponible : exécution O(n) garantie,
+# sans backtracking, sur texte adversarial. L'API python de re2 est un
+# drop-in de `re` pour notre usage (finditer + groupes nommés) ; on vérifie
+# au chargement qu'elle se comporte comme attendu, sinon retour stdlib.
+def _select_scanner():
     try:
-        # Essaye d’abord dans file_text_metadata
-        cur = conn.execute("""
-            SELECT Exerpt_full FROM file_text_metadata WHERE file_id = ?
-        """, (file_id,))
-        row = cur.fetchone()
-        if row and row[0]:
-            return row[0]
-        
-        # Sinon, on peut essayer d’extraire depuis un autre type (ex: office, pdf)
-        # Ici, on retourne une chaîne vide si pas trouvé
-        return ""
-    except Exception as e:
-        print(f"⚠️ Erreur lecture texte (file_id={file_id}): {e}")
-        return ""
+        import re2  # type: ignore
+        # Les quantificateurs possessifs ({m,n}+) ne font pas partie de
+        # la syntaxe RE2 — et n'y serviraient à rien : RE2 ne backtracke
+        # jamais. On les dépossessive avant de compiler, sinon la
+        # compilation échoue et le chemin re2 est mort en silence.
+        pattern = re.sub(r"(\{\d+,\d+\})\+", r"\1", COMBINED.pattern)
+        scanner = re2.compile(pattern)
+        probe = scanner.search("contact: test@example.com")
+        if probe is not None and probe.lastgroup == "email":
+            return scanner
+    except Exception:
+        pass
+    return COMBINED
+
+SCANNER = _select_scanner()
+
+# -------------------------------
+# ⚡ PRÉFILTRE LITTÉRAL : rejet rapide des textes sans ancre
+# -------------------------------
+
+# Sous-chaînes littérales tirées des patterns : chaque catégorie exige
+# soit un chiffre (NSS, téléphone, CB, IBAN, URL internes...), soit une
+# de ces ancres. Un texte qui ne contient rien de tout ça ne peut
+# matcher aucune catégorie — on évite alors la grande alternation.
+
+
+def _extension_anchors():
+    """
+    Ancres des deux catégories d'extensions, DÉRIVÉES de leurs patterns
+    (pures alternations de littéraux) : une extension ajoutée au pattern
+    est couverte d'office, la liste manuelle avait déjà dérivé (.backup
+    matchait les regex mais passait sous le préfiltre).
+    """
+    anchors = [
+        alt.replace("\\", "").lower()
+        for alt in REGEXES["fichiers_temporaires"]["pattern"].pattern.split("|")
+    ]
+    inner = re.fullmatch(
+        r"\\\.\((.+)\)\$", REGEXES["extensions_suspectes"]["pattern"].pattern
+    )
+    anchors.extend("." + alt.lower() for alt in inner.group(1).split("|"))
+    return tuple(anchors)
+
+
+_LITERAL_ANCHORS = (
+    # donnees_personnelles / localisation
+    "nom", "naissance", "adresse", "ville", "département", "postal",
+    "dossier", "lat", "long", "coordonnées",
+    # email
+    "@",
+    # mot_de_passe_cle_api
+    "pass", "secret", "token", "api", "access",
+    # identifiants_machines
+    "mac", "uuid", "serial", "hostname", "machine", "computer",
+    # utilisateurs_roles
+    "user", "utilisateur", "login", "fonction", "role", "rôle",
+    # historique_fichiers
+    "modified", "deleted", "chmod", "chown", "mv", "cp", "rm", "rename",
+    # commentaires_sensibles
+    "warning", "sensible", "confidentiel", "todo", "test", "danger",
+    "important", "publier", "supprimer",
+    # fichiers_temporaires / extensions_suspectes
+) + _extension_anchors()
+
+_DIGIT_RE = re.compile(r"\d")
+_ANCHOR_RE = re.compile("|".join(map(re.escape, _LITERAL_ANCHORS)))
+
+
+def _build_prefilter():
+    """
+    Aho-Corasick (pyahocorasick) si dispo : une seule passe sur le texte
+    quel que soit le nombre d'ancres (même mécanique que le préfiltre
+    Teddy d'Hyperscan). Sinon, alternation de littéraux purs — pas de
+    backtracking possible, bien moins cher que le scanner complet.
+    """
+    try:
+        import ahocorasick  # type: ignore
+        automaton = ahocorasick.Automaton()
+        for anchor in _LITERAL_ANCHORS:
+            automaton.add_word(anchor, anchor)
+        automaton.make_automaton()
+
+        def _hit(lowered: str) -> bool:
+            for _ in automaton.iter(lowered):
+                return True
+            return False
+
+        return _hit
+    except ImportError:
+        return lambda lowered: _ANCHOR_RE.search(lowered) is not None
+
+
+_ANCHOR_HIT = _build_prefilter()
+
+
+def _may_contain_detection(text: str) -> bool:
+    """Vrai si le texte PEUT contenir une détection (jamais de faux négatif)."""
+    if _DIGIT_RE.search(text):
+        return True
+    return _ANCHOR_HIT(text.lower())
+
+
+def _match_value(m: "re.Match", category: str) -> str:
+    """
+    Reproduit la sélection de valeur de l'ancien findall par catégorie :
+    groupe 2 si le pattern a plusieurs groupes (ex: clé + valeur),
+    groupe 1 s'il n'en a qu'un, sinon le match complet.
+    """
+    base = COMBINED.groupindex[category]
+    ngroups = _SUB_GROUPS[category]
+    if ngroups == 0:
+        return m.group(base)
+    if ngroups == 1:
+        return m.group(base + 1) or ""
+    return m.group(base + 2) or ""
+
 
 # -------------------------------
 # 🧠 FONCTION : Scanner un texte avec toutes les regex
 # -------------------------------
-def scan_text_with_regex(text: str, file_id: int, conn: sqlite3.Connection) -> List[Dict]:
-    """Scanne un texte avec toutes les regex, retourne les résultats."""
-    results = []
+# Fenêtrage des gros textes : chaque appel regex reste dans le cache
+# CPU et borne le coût d'un éventuel backtracking à une fenêtre.
+# Le recouvrement couvre la plus longue détection possible à cheval
+# sur une frontière ; les doublons de la zone recouverte sont dédupliqués.
+_SCAN_WINDOW = 64 * 1024
+_WINDOW_OVERLAP = 256
+
+# Catégories ancrées en fin de texte ($) : dans une fenêtre, $ matche à
+# la fin ARTIFICIELLE de la fenêtre et fabriquerait des détections que
+# le scan plein texte ne produit pas. Leurs matches ne sont retenus que
+# s'ils tombent sur la vraie fin du texte complet.
+_END_ANCHORED = frozenset(
+    name for name, config in REGEXES.items()
+    if config["pattern"].pattern.endswith("$")
+)
+
+# L'alternation combinée ne rend qu'UN match par position : une détection
+# d'une autre catégorie imbriquée dans l'empan consommé (téléphone dans
+# une ligne d'adresse) ou partant de la même position serait perdue.
+# Chaque empan consommé est donc re-scanné avec les patterns individuels
+# des autres catégories — les matches sont rares, ça ne coûte rien.
+_OTHER_PATTERNS = {
+    name: tuple(
+        (other, config["pattern"], config["pattern"].groups)
+        for other, config in REGEXES.items() if other != name
+    )
+    for name in REGEXES
+}
+
+
+def scan_text_with_regex(text: str, file_id: int, conn: sqlite3.Connection) -> Tuple[List[int], List[str], List[str]]:
+    """
+    Scanne un texte avec toutes les regex (une seule passe).
+    Retourne trois listes parallèles (file_ids, catégories, valeurs) :
+    pas un dict par détection, donc zip(*résultat) part directement
+    dans executemany sans reconstruction de tuples.
+    """
+    file_ids: List[int] = []
+    categories: List[str] = []
+    values: List[str] = []
+
+    # Court-circuit : la plupart des fichiers ne contiennent aucune ancre
+    if not _may_contain_detection(text):
+        return file_ids, categories, values
+
+    # Liaisons locales : les lookups globaux/attributs sortent de la
+    # boucle chaude (LOAD_FAST au lieu de LOAD_GLOBAL + LOAD_ATTR)
+    finditer = SCANNER.finditer
+    descriptions = DESCRIPTIONS
+    match_value = _match_value
 
-    for category_name, config in REGEXES.items():
-        matches = config["pattern"].findall(text)
-        if not matches:
-            continue
+    seen = set()
+    text_len = len(text)
 
-        for match in matches:
-            # Gérer les groupes (ex : mot de passe = mot + valeur)
-            if isinstance(match, tuple):
-                value = match[1] if len(match) > 1 else match[0]
-            else:
-                value = match
+    def _emit(category_name: str, value: str, start: int, g_end: int) -> None:
+        """Retient une détection (filtre $, déduplication recouvrement)."""
+        # Les patterns en $ ne valent que sur la vraie fin du texte
+        # (ou juste avant son \n final, sémantique de $ sans MULTILINE),
+        # pas sur la coupe artificielle d'une fenêtre ou d'un empan
+        if category_name in _END_ANCHORED:
+            if g_end != text_len and not (g_end == text_len - 1 and text[-1] == "\n"):
+                return
 
-            value = value.strip()
+        key = (category_name, value, start)
+        if key in seen:
+            return
+        seen.add(key)
 
-            # Ajouter dans la liste
-            results.append({
-                "file_id": file_id,
-                "category": config["description"],
-                "value": value,
-                "line_number": None,  # Optionnel : tu peux parser par ligne si besoin
-                "char_offset": None,
-            })
+        file_ids.append(file_id)
+        categories.append(descriptions[category_name])
+        values.append(value)
 
-    return results
+    step = _SCAN_WINDOW - _WINDOW_OVERLAP
+    for base in range(0, text_len, step):
+        window = text[base:base + _SCAN_WINDOW]
+
+        for m in finditer(window):
+            category_name = m.lastgroup
+            _emit(category_name, match_value(m, category_name).strip(),
+                  base + m.start(), base + m.end())
+
+            # Re-scan de l'empan consommé avec les patterns individuels
+            # des autres catégories : retrouve les détections imbriquées
+            # ou partant de la même position que le match combiné. La
+            # marge couvre un match imbriqué débordant de l'empan.
+            span_end = m.end() + _WINDOW_OVERLAP
+            for other_name, other_pattern, ngroups in _OTHER_PATTERNS[category_name]:
+                for sm in other_pattern.finditer(window, m.start(), span_end):
+                    # endpos agit comme une fin de texte : un match collé
+                    # à cette coupe artificielle peut être tronqué (\b
+                    # fabriqué) — le scan principal le (re)trouvera s'il
+                    # est réel
+                    if sm.end() == span_end and span_end < len(window):
+                        continue
+                    if ngroups == 0:
+                        value = sm.group(0)
+                    elif ngroups == 1:
+                        value = sm.group(1) or ""
+                    else:
+                        value = sm.group(2) or ""
+                    _emit(other_name, value.strip(),
+                          base + sm.start(), base + sm.end())
+
+        if base + _SCAN_WINDOW >= text_len:
+            break
+
+    return file_ids, categories, values
 
 # -------------------------------
 # 💾 FONCTION : Enregistrer les résultats dans la base
 # -------------------------------
-def save_detections_to_db(results: List[Dict], conn: sqlite3.Connection):
-    """Enregistre les détections dans la table file_sensitivity_detection."""
-    if not results:
+
+# SQL constant au niveau module : le cache de statements de sqlite3 est
+# indexé sur la string exacte, donc le parse/plan n'est payé qu'une fois
+# pour tout le scan (au lieu d'une string triple-quote allouée par appel)
+INSERT_SQL = (
+    "INSERT OR IGNORE INTO file_sensitivity_detection "
+    "(file_id, category, value, detected_at) "
+    "VALUES (?, ?, ?, datetime('now'))"
+)
+
+
+def save_detections_to_db(results: Tuple[List[int], List[str], List[str]], conn: sqlite3.Connection):
+    """
+    Enregistre les détections (trois listes parallèles) dans la table
+    file_sensitivity_detection.
+    Ne commit PAS : l'appelant regroupe les écritures dans une seule
+    transaction (un fsync par scan, pas un par fichier).
+    """
+    file_ids, categories, values = results
+    if not file_ids:
         return
 
     try:
-        conn.executemany("""
-            INSERT OR IGNORE INTO file_sensitivity_detection 
-            (file_id, category, value, detected_at)
-            VALUES (?, ?, ?, datetime('now'))
-        """, [
-            (r["file_id"], r["category"], r["value"])
-            for r in results
-        ])
-        conn.commit()
-        print(f"✅ {len(results)} détections sauvegardées.")
+        conn.executemany(INSERT_SQL, zip(file_ids, categories, values))
+        print(f"✅ {len(file_ids)} détections sauvegardées.")
     except Exception as e:
         print(f"❌ Erreur sauvegarde : {e}")
         conn.rollback()
 
+# -------------------------------
+# 🧵 PARALLÉLISATION : scan par lots sur tous les cœurs
+# -------------------------------
+
+# Nombre de fichiers par unité de travail envoyée aux workers
+_CHUNK_ROWS = 64
+
+# En dessous de ce volume, le coût de démarrage du pool dépasse le gain
+_PARALLEL_MIN_FILES = 128
+
+
+def _scan_chunk(rows: List[Tuple[int, str]]) -> Tuple[List[int], List[str], List[str]]:
+    """
+    Worker : scanne un lot de (file_id, texte). Le regex combiné est déjà
+    compilé au niveau module, donc partagé avec les workers via fork (COW).
+    """
+    file_ids: List[int] = []
+    categories: List[str] = []
+    values: List[str] = []
+    for file_id, text in rows:
+        ids, cats, vals = scan_text_with_regex(text, file_id, None)
+        file_ids.extend(ids)
+        categories.extend(cats)
+        values.extend(vals)
+    return file_ids, categories, values
+
+
 # -------------------------------
 # 🚀 FONCTION PRINCIPALE : Scanner tous les fichiers
 # -------------------------------
+
+# Nombre de lignes matérialisées en RAM à la fois : la mémoire reste
+# O(page) même sur un corpus énorme (fetchall() chargerait tout)
+_PAGE_ROWS = 1024
+
+# Taille du tampon de détections avant écriture/commit (un gros
+# executemany amortit bien mieux qu'une écriture par fichier)
+_FLUSH_ROWS = 10000
+
+_COUNT_SQL = (
+    "SELECT COUNT(*) FROM file_text_metadata "
+    "WHERE Exerpt_full IS NOT NULL AND Exerpt_full != ''"
+)
+
+# Parcours par curseur (keyset) : pas d'OFFSET qui rescanne le début
+_SELECT_PAGE_SQL = (
+    "SELECT f.id, f.path, t.Exerpt_full "
+    "FROM file f "
+    "JOIN file_text_metadata t ON f.id = t.file_id "
+    "WHERE t.Exerpt_full IS NOT NULL AND t.Exerpt_full != '' "
+    "AND f.id > ? ORDER BY f.id LIMIT ?"
+)
+
+# Index partiel : le COUNT et la jointure ne visitent que les lignes
+# qui ont effectivement du texte
+_PARTIAL_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_ftm_exerpt_nonnull "
+    "ON file_text_metadata(file_id) "
+    "WHERE Exerpt_full IS NOT NULL AND Exerpt_full != ''"
+)
+
+
 def run_forensic_scan(db_path: str = "working_DB/project_index.db"):
     """Scanne tous les fichiers de la base avec les regex."""
     print("🔍 Début du scan forensic (16 catégories)...")
-    
+
     conn = sqlite3.connect(db_path)
     try:
-        # Récupérer tous les fichiers qui ont du texte
-        cur = conn.execute("""
-            SELECT f.id, f.path, t.Exerpt_full 
-            FROM file f 
-            JOIN file_text_metadata t ON f.id = t.file_id
-            WHERE t.Exerpt_full IS NOT NULL AND t.Exerpt_full != ''
-        """)
-        
-        total_files = 0
+        # PRAGMAs de perf : WAL regroupe les fsync aux checkpoints
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute("PRAGMA temp_store = MEMORY;")
+
+        conn.execute(_PARTIAL_INDEX_SQL)
+
+        total_files = conn.execute(_COUNT_SQL).fetchone()[0]
         total_detections = 0
 
-        for row in cur.fetchall():
-            file_id = row[0]
-            path = row[1]
-            text = row[2]
-
-            print(f"📄 Analyse : {path} (ID: {file_id})")
-            detections = scan_text_with_regex(text, file_id, conn)
-            save_detections_to_db(detections, conn)
-            
-            total_files += 1
-            total_detections += len(detections)
+        workers = os.cpu_count() or 1
+        parallel = total_files >= _PARALLEL_MIN_FILES and workers > 1
+
+        # Scan regex réparti sur tous les cœurs ; les écritures SQLite
+        # restent sur le process principal (pas de conflit de verrou)
+        pool = multiprocessing.Pool(workers) if parallel else None
+        if parallel:
+            print(f"🧵 Scan parallèle : {total_files} fichiers sur {workers} cœurs...")
+
+        # Tampon SoA : on accumule les détections de nombreux fichiers
+        # et on écrit par gros executemany (moins d'appels, moins de gc)
+        buf_ids: List[int] = []
+        buf_cats: List[str] = []
+        buf_vals: List[str] = []
+
+        def _flush():
+            nonlocal total_detections
+            if not buf_ids:
+                return
+            save_detections_to_db((buf_ids, buf_cats, buf_vals), conn)
+            conn.commit()
+            total_detections += len(buf_ids)
+            buf_ids.clear()
+            buf_cats.clear()
+            buf_vals.clear()
+
+        try:
+            last_id = 0
+            while True:
+                page = conn.execute(_SELECT_PAGE_SQL, (last_id, _PAGE_ROWS)).fetchall()
+                if not page:
+                    break
+                last_id = page[-1][0]
+
+                if parallel:
+                    work = [(row[0], row[2]) for row in page]
+                    chunks = [work[i:i + _CHUNK_ROWS] for i in range(0, len(work), _CHUNK_ROWS)]
+                    for ids, cats, vals in pool.imap_unordered(_scan_chunk, chunks):
+                        buf_ids.extend(ids)
+                        buf_cats.extend(cats)
+                        buf_vals.extend(vals)
+                        if len(buf_ids) >= _FLUSH_ROWS:
+                            _flush()
+                else:
+                    for file_id, path, text in page:
+                        print(f"📄 Analyse : {path} (ID: {file_id})")
+                        ids, cats, vals = scan_text_with_regex(text, file_id, conn)
+                        buf_ids.extend(ids)
+                        buf_cats.extend(cats)
+                        buf_vals.extend(vals)
+                        if len(buf_ids) >= _FLUSH_ROWS:
+                            _flush()
+
+            _flush()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        # Commit final : une transaction couvre tout le reliquat du scan
+        conn.commit()
 
         print(f"\n✅ Analyse terminée : {total_files} fichiers analysés, {total_detections} détections trouvées.")
 
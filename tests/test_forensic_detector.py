@@ -0,0 +1,126 @@
+# tests/test_forensic_detector.py
+# Régression du scan forensique : la passe unique (alternation combinée)
+# ne doit perdre AUCUNE détection que les 16 regex indépendantes
+# produisent — notamment les détections imbriquées dans l'empan d'une
+# autre catégorie (téléphone dans une ligne d'adresse, "secret" dans
+# une valeur de mot de passe).
+# Lancement : python -m unittest tests.test_forensic_detector
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.forensic_detector import (
+    DESCRIPTIONS,
+    REGEXES,
+    _extension_anchors,
+    _may_contain_detection,
+    scan_text_with_regex,
+)
+
+# Échantillons couvrant les cas de chevauchement inter-catégories
+SAMPLES = [
+    "Adresse: 12 rue des Lilas, appeler le 06 12 34 56 78",
+    "password = supersecret123",
+    "Nom : Jean Dupont, email jean.dupont@example.fr, tel 06 98 76 54 32",
+    "NSS 123 456 789 0123 et CB 4970 1234 5678 9010 sur la même ligne",
+    "User: admin TODO ne pas publier le token = abcd1234efgh5678",
+    "fichier sans rien de sensible, juste du texte ordinaire sans chiffre",
+]
+
+
+def _baseline_detections(text):
+    """
+    Détections de référence : chaque catégorie scannée indépendamment
+    (sémantique des 16 findall d'origine), même sélection de valeur que
+    le scan combiné (groupe 2 si le pattern a plusieurs groupes, groupe
+    1 s'il en a un, sinon le match complet).
+    """
+    detections = set()
+    for name, config in REGEXES.items():
+        pattern = config["pattern"]
+        for m in pattern.finditer(text):
+            if pattern.groups == 0:
+                value = m.group(0)
+            elif pattern.groups == 1:
+                value = m.group(1) or ""
+            else:
+                value = m.group(2) or ""
+            detections.add((DESCRIPTIONS[name], value.strip()))
+    return detections
+
+
+class TestScanCoverage(unittest.TestCase):
+    def test_combined_scan_covers_independent_scans(self):
+        """La passe combinée retrouve tout ce que les regex séparées trouvent."""
+        for text in SAMPLES:
+            with self.subTest(text=text):
+                _, categories, values = scan_text_with_regex(text, 1, None)
+                found = set(zip(categories, values))
+                missing = _baseline_detections(text) - found
+                self.assertEqual(missing, set(),
+                                 f"détections perdues par la passe combinée : {missing}")
+
+    def test_nested_telephone_in_address_line(self):
+        """Un téléphone dans une ligne d'adresse n'est pas masqué."""
+        _, categories, values = scan_text_with_regex(
+            "Adresse: 12 rue des Lilas, appeler le 06 12 34 56 78", 1, None)
+        found = set(zip(categories, values))
+        self.assertIn(("Téléphone français", "06 12 34 56 78"), found)
+        self.assertIn(DESCRIPTIONS["donnees_personnelles"], categories)
+
+    def test_nested_secret_in_password_value(self):
+        """Le 'secret' d'une valeur de mot de passe reste détecté."""
+        _, categories, values = scan_text_with_regex(
+            "password = supersecret123", 1, None)
+        found = set(zip(categories, values))
+        self.assertIn(("Commentaires ou balises sensibles", "secret"), found)
+        self.assertIn(DESCRIPTIONS["mot_de_passe_cle_api"], categories)
+
+    def test_window_boundary_does_not_fabricate_end_anchor(self):
+        """$ ne matche pas sur la coupe artificielle d'une fenêtre."""
+        text = "a" * (64 * 1024 - 9) + "script.py" + "b" * 5000
+        _, categories, _ = scan_text_with_regex(text, 1, None)
+        self.assertNotIn(DESCRIPTIONS["extensions_suspectes"], categories)
+        _, categories, _ = scan_text_with_regex("voir script.py", 1, None)
+        self.assertIn(DESCRIPTIONS["extensions_suspectes"], categories)
+
+
+class TestPrefilter(unittest.TestCase):
+    """Le préfiltre littéral ne doit JAMAIS produire de faux négatif."""
+
+    def test_backup_extension_passes_prefilter(self):
+        """Régression : .backup matchait les regex mais pas le préfiltre."""
+        text = "voir le fichier mydata.backup"  # sans chiffre
+        self.assertTrue(_may_contain_detection(text))
+        _, categories, _ = scan_text_with_regex(text, 1, None)
+        self.assertIn(DESCRIPTIONS["fichiers_temporaires"], categories)
+
+    def test_every_extension_literal_is_anchored(self):
+        """Chaque alternative littérale des patterns d'extensions passe."""
+        for literal in _extension_anchors():
+            with self.subTest(literal=literal):
+                self.assertTrue(_may_contain_detection(f"fichier{literal}"))
+
+    def test_digit_free_witnesses_pass_prefilter(self):
+        """Un texte sans chiffre qui matche une regex passe le préfiltre."""
+        witnesses = {
+            "donnees_personnelles": "Nom : Jean Dupont de Paris",
+            "email": "contact jean@example.fr",
+            "mot_de_passe_cle_api": "secret = valeurtreslongue",
+            "identifiants_machines": "Hostname: abcdef abcdef",
+            "utilisateurs_roles": "Login: administrateur",
+            "historique_fichiers": "deleted /var/data/archive",
+            "commentaires_sensibles": "CONFIDENTIEL ne pas publier",
+        }
+        for name, text in witnesses.items():
+            with self.subTest(category=name):
+                self.assertIsNotNone(REGEXES[name]["pattern"].search(text))
+                self.assertTrue(_may_contain_detection(text))
+                _, categories, _ = scan_text_with_regex(text, 1, None)
+                self.assertIn(DESCRIPTIONS[name], categories)
+
+
+if __name__ == "__main__":
+    unittest.main()
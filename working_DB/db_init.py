@@ -1,19 +1,28 @@
 #!/usr/bin/env python3
+import shutil
 import sqlite3
 from pathlib import Path
-from src.config import DB_PATH 
+from src.config import DB_PATH
 
 # Chemin absolu a modifier
 BASE_DIR = Path(__file__).resolve().parent.parent   # monte deux niveaux : on arrive à la racine du projet
 DB_PATH = BASE_DIR / "working_DB" / "project_index.db"
 
-SCHEMA_SQL = """
+# Base modèle préconstruite (voir make_template) : la copier évite de
+# re-parser et ré-exécuter tout le DDL à chaque base neuve
+TEMPLATE_PATH = Path(__file__).resolve().parent / "template.db"
+
+# Tables seules : les index sont créés séparément APRÈS le chargement en
+# masse (voir SCHEMA_INDEXES_SQL / create_indexes), pour que les INSERT
+# du scan initial ne maintiennent pas les B-trees ligne par ligne
+SCHEMA_TABLES_SQL = """
 ----------------------------------------------------------------------
 -- 0. FOLDERS (unités logiques de scoring)
 ----------------------------------------------------------------------
 
 CREATE TABLE IF NOT EXISTS folder (
-    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    -- Pas d'AUTOINCREMENT (voir table file) : rowid par défaut suffit
+    id              INTEGER PRIMARY KEY,
     path            TEXT NOT NULL UNIQUE,          -- chemin absolu / logique
     parent_id       INTEGER REFERENCES folder(id) ON DELETE CASCADE,
     files_subcount  INTEGER,
@@ -23,15 +32,14 @@ CREATE TABLE IF NOT EXISTS folder (
     app_fold        INTEGER
 );
 
-CREATE INDEX IF NOT EXISTS idx_folder_parent_id ON folder(parent_id);
-CREATE INDEX IF NOT EXISTS idx_folder_path       ON folder(path);
-
 ----------------------------------------------------------------------
 -- 1. MAIN FILE TABLE
 ----------------------------------------------------------------------
 
 CREATE TABLE IF NOT EXISTS file (
-    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    -- Pas d'AUTOINCREMENT : l'allocateur rowid par défaut suffit (ids
+    -- croissants) et évite une écriture sqlite_sequence par INSERT
+    id              INTEGER PRIMARY KEY,
 
     -- Lien logique vers le dossier
     folder_id       INTEGER
@@ -54,11 +62,24 @@ CREATE TABLE IF NOT EXISTS file (
     -- Suivi interne
     ent_created_at  TEXT DEFAULT (datetime('now')),
     updated_at      TEXT,
-    last_update     TEXT,
+    last_update     TEXT
+);
+
+----------------------------------------------------------------------
+-- 1b. FILE SCORES (colonnes froides d'analyse, séparées de file)
+----------------------------------------------------------------------
+-- Ces colonnes sont NULL pendant tout le scan initial : les garder
+-- dans file gonflait chaque ligne (et chaque réécriture de page) pour
+-- rien. La table file reste étroite et chaude, file_scores est peuplée
+-- plus tard par les étapes d'analyse.
+
+CREATE TABLE IF NOT EXISTS file_scores (
+    file_id         INTEGER PRIMARY KEY
+                    REFERENCES file(id) ON DELETE CASCADE,
 
     -- Sémantique métier (héritée de ton schéma)
     doc_function    TEXT,
-    doc_family      INTEGER,            -- 0 : undef , 1 : HRM , 2 : Finance&accounting , 3 : Core Job , 4 : legal , 5: Comm&Marketing , 6: IT , 7: logistics , 8: Sales , 99 : multiple 
+    doc_family      INTEGER,            -- 0 : undef , 1 : HRM , 2 : Finance&accounting , 3 : Core Job , 4 : legal , 5: Comm&Marketing , 6: IT , 7: logistics , 8: Sales , 99 : multiple
 
     -- Niveau d'analyse à prévoir
     llm_analys_stat INTEGER,            -- 0 : no need semantic analysis    1: low    2: medium    3: high
@@ -81,17 +102,11 @@ CREATE TABLE IF NOT EXISTS file (
 
     rgpd_score_file      REAL,         -- [0,1] risque RGPD estimé
     business_criticality REAL,         -- [0,1] customer rules defined prior to analysis
-    legal_risk_weight    REAL,         -- [0,1] analysis of potential legal contracting 
+    legal_risk_weight    REAL,         -- [0,1] analysis of potential legal contracting
     finance_risk_weight  REAL,         -- [0,1] analysis of potential financial risks
     combined_score       REAL          -- [0,1] Combined score
 );
 
-CREATE INDEX IF NOT EXISTS idx_file_folder_id      ON file(folder_id);
-CREATE INDEX IF NOT EXISTS idx_file_ext_family     ON file(ext_family);
-CREATE INDEX IF NOT EXISTS idx_file_decl_extension ON file(decl_extension);
-CREATE INDEX IF NOT EXISTS idx_file_true_extension ON file(true_extension);
-CREATE INDEX IF NOT EXISTS idx_file_doc_family     ON file(doc_family);
-
 ----------------------------------------------------------------------
 -- 2. Images
 ----------------------------------------------------------------------
@@ -685,15 +700,15 @@ CREATE TABLE IF NOT EXISTS file_project_metadata (
 );
 
 
-#----------------------------------------------------------------------
-#-- 17. DÉTECTION DE DONNÉES SENSIBLES (regex forensic)
-#----------------------------------------------------------------------
+----------------------------------------------------------------------
+-- 17. DÉTECTION DE DONNÉES SENSIBLES (regex forensic)
+----------------------------------------------------------------------
 
 CREATE TABLE IF NOT EXISTS file_sensitivity_detection (
     id              INTEGER PRIMARY KEY AUTOINCREMENT,
 
     -- Référence au fichier
-    file_id         INTEGER NOT NULL,
+    file_id         INTEGER NOT NULL
                     REFERENCES file(id) ON DELETE CASCADE,
 
     -- Type de donnée détectée
@@ -713,31 +728,138 @@ CREATE TABLE IF NOT EXISTS file_sensitivity_detection (
     UNIQUE(file_id, category, value)
 );
 
--- Index
+----------------------------------------------------------------------
+-- 18. VUE UNIFIÉE DES MÉTADONNÉES
+----------------------------------------------------------------------
+-- Localise en une seule requête la table de métadonnées qui possède
+-- une ligne pour un fichier donné (au lieu de 15 LEFT JOIN côté
+-- client). Chaque branche est un simple scan de clé primaire.
+
+CREATE VIEW IF NOT EXISTS file_metadata_kind AS
+    SELECT file_id, 'image'      AS kind FROM file_image_metadata
+    UNION ALL SELECT file_id, 'audio'      FROM file_audio_metadata
+    UNION ALL SELECT file_id, 'video'      FROM file_video_metadata
+    UNION ALL SELECT file_id, 'office'     FROM file_office_metadata
+    UNION ALL SELECT file_id, 'pdf'        FROM file_pdf_metadata
+    UNION ALL SELECT file_id, 'text'       FROM file_text_metadata
+    UNION ALL SELECT file_id, 'archive'    FROM file_archive_metadata
+    UNION ALL SELECT file_id, 'disk_image' FROM file_disk_image_metadata
+    UNION ALL SELECT file_id, 'exe'        FROM file_exe_metadata
+    UNION ALL SELECT file_id, 'code'       FROM file_code_metadata
+    UNION ALL SELECT file_id, 'database'   FROM file_database_metadata
+    UNION ALL SELECT file_id, 'data'       FROM file_data_metadata
+    UNION ALL SELECT file_id, '3d'         FROM file_3d_metadata
+    UNION ALL SELECT file_id, 'font'       FROM file_font_metadata
+    UNION ALL SELECT file_id, 'project'    FROM file_project_metadata;
+
+"""
+
+# Index créés après chargement : sur une base vide ou déjà chargée,
+# un CREATE INDEX = un scan trié de la table (bien moins cher que de
+# maintenir chaque B-tree à chaque INSERT du scan initial)
+SCHEMA_INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS idx_folder_parent_id ON folder(parent_id);
+CREATE INDEX IF NOT EXISTS idx_folder_path       ON folder(path);
+
+CREATE INDEX IF NOT EXISTS idx_file_folder_id      ON file(folder_id);
+CREATE INDEX IF NOT EXISTS idx_file_ext_family     ON file(ext_family);
+CREATE INDEX IF NOT EXISTS idx_file_decl_extension ON file(decl_extension);
+CREATE INDEX IF NOT EXISTS idx_file_true_extension ON file(true_extension);
+CREATE INDEX IF NOT EXISTS idx_scores_doc_family  ON file_scores(doc_family);
+
 CREATE INDEX IF NOT EXISTS idx_detection_file_id ON file_sensitivity_detection(file_id);
 CREATE INDEX IF NOT EXISTS idx_detection_category ON file_sensitivity_detection(category);
 CREATE INDEX IF NOT EXISTS idx_detection_value ON file_sensitivity_detection(value);
-
 """
 
+# Compatibilité : schéma complet (tables + index) en un seul script
+SCHEMA_SQL = SCHEMA_TABLES_SQL + SCHEMA_INDEXES_SQL
+
+
 def init_db(db_path: str = DB_PATH) -> None:
-    """Create the SQL Tables if they don't exist."""
+    """Create the SQL Tables if they don't exist (indexes come later)."""
     db_path = str(db_path)
     Path(db_path).parent.mkdir(parents=True, exist_ok=True)
 
+    # Base neuve (ou vide) : on peut encore choisir la taille de page
+    fresh = not Path(db_path).exists() or Path(db_path).stat().st_size == 0
+
+    # Base neuve + modèle disponible : une copie de fichier remplace le
+    # parse et l'exécution de tout le DDL (O(ms) au lieu de dizaines de
+    # statements), précieux quand init_db tourne souvent (tests, CLI)
+    if fresh and TEMPLATE_PATH.exists() and Path(db_path).resolve() != TEMPLATE_PATH:
+        shutil.copyfile(TEMPLATE_PATH, db_path)
+        return
+
+    _build_schema(db_path, fresh)
+
+
+def _build_schema(db_path: str, fresh: bool) -> None:
+    """Chemin DDL classique : exécute SCHEMA_TABLES_SQL sur la base."""
     conn = sqlite3.connect(db_path)
     try:
+        # Pages de 16 Ko sur base neuve : les lignes larges de `file` et
+        # des tables de métadonnées (beaucoup de colonnes TEXT) tiennent
+        # sans pages de débordement, et les B-trees se scindent moins
+        # souvent pendant les gros INSERT. Doit être posé AVANT le
+        # passage en WAL, qui fige la taille de page.
+        if fresh:
+            conn.execute("PRAGMA page_size = 16384;")
+            conn.execute("VACUUM;")  # matérialise la taille de page
+
         # PRAGMA de base
         conn.execute("PRAGMA foreign_keys = ON;")
         conn.execute("PRAGMA journal_mode = WAL;")
         conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute("PRAGMA cache_size = -131072;")  # 128 Mo : B-tree chaud résident
+
+        # Création des tables seules ; les index sont posés par
+        # create_indexes() une fois le chargement initial terminé
+        conn.executescript(SCHEMA_TABLES_SQL)
+        conn.commit()
+    finally:
+        conn.close()
 
-        # Création des tables
-        conn.executescript(SCHEMA_SQL)
+
+def create_indexes(db_path: str = DB_PATH) -> None:
+    """
+    Crée (idempotent, IF NOT EXISTS) tous les index du schéma.
+    À appeler après le chargement en masse : un index construit d'un
+    coup est plus rapide à bâtir et moins fragmenté qu'un index
+    maintenu ligne à ligne pendant les INSERT.
+    """
+    conn = sqlite3.connect(str(db_path))
+    try:
+        conn.executescript(SCHEMA_INDEXES_SQL)
+        # Statistiques pour le planificateur : garantit que les jointures
+        # et UPSERT passent bien par les index fraîchement construits
+        conn.execute("ANALYZE;")
         conn.commit()
     finally:
         conn.close()
 
+def make_template() -> None:
+    """
+    (Re)construit working_DB/template.db par le chemin DDL classique.
+    À relancer après toute modification de SCHEMA_TABLES_SQL, sinon les
+    bases neuves copieront un modèle périmé.
+    """
+    tmp = TEMPLATE_PATH.with_name("template.db.tmp")
+    if tmp.exists():
+        tmp.unlink()
+    try:
+        _build_schema(str(tmp), fresh=True)
+        tmp.replace(TEMPLATE_PATH)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    print(f"Modèle reconstruit : {TEMPLATE_PATH}")
+
+
 if __name__ == "__main__":
-    init_db()
-    print(f"Base initialisée : {DB_PATH}")
\ No newline at end of file
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "make-template":
+        make_template()
+    else:
+        init_db()
+        print(f"Base initialisée : {DB_PATH}")
\ No newline at end of file
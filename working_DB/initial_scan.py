@@ -1,141 +1,704 @@
 import os
 import sqlite3
 import hashlib
+import mmap
+import multiprocessing
+import sys
+import tempfile
+import types
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    from working_DB.db_init import create_indexes, init_db
+except ImportError:  # exécution directe depuis working_DB/
+    from db_init import create_indexes, init_db
+
+try:
+    from src.config import HASH_ALGO
+except ImportError:  # exécution directe depuis working_DB/
+    HASH_ALGO = os.environ.get("LOCARD_HASH_ALGO", "sha256")
+
+# BLAKE3 optionnel : bien plus rapide que SHA-256 (SIMD + hachage en
+# arbre multi-thread) et largement suffisant comme clé d'identité /
+# détection de changement. La colonne garde son nom hash_sha256 pour ne
+# pas casser le schéma ni les requêtes de doublons existantes.
+try:
+    import blake3
+    HAVE_BLAKE3 = True
+except ImportError:
+    HAVE_BLAKE3 = False
+
+# Algorithme réellement actif (le repli silencieux sur SHA-256 compte),
+# et son code enregistré dans PRAGMA user_version : SHA-256 et BLAKE3
+# produisent tous deux 64 hexa, indistinguables a posteriori, donc la
+# base doit porter l'étiquette de l'algorithme de ses hashs stockés.
+# 0 = base d'avant l'étiquetage, hachée en SHA-256.
+_EFFECTIVE_ALGO = "blake3" if (HASH_ALGO == "blake3" and HAVE_BLAKE3) else "sha256"
+_HASH_ALGO_CODES = {"sha256": 1, "blake3": 2}
+
+# Code sentinelle « migration en cours », posé avant qu'un scan de
+# changement d'algorithme ne commence à persister des hashs du nouveau
+# format : il ne correspond à aucun algorithme, donc un scan relancé
+# après interruption re-hache tout au lieu de réutiliser un mélange.
+# L'étiquette définitive n'est écrite que par le commit final du scan.
+_ALGO_MIGRATING = 255
+
 DB_PATH = "working_DB/project_index.db"
 
+# ------------------------------------------------------------------
+# Classification extension -> famille, construite une fois à l'import
+# ------------------------------------------------------------------
+# Ensemble fixe et connu : un dict pré-construit à clés internées donne
+# un lookup O(1) sans comparaison de chaînes caractère par caractère
+# (decl_extension est lui aussi interné, le hash est donc mémoïsé et
+# l'égalité se résout par identité de pointeur). Les groupes reflètent
+# le dispatch de metadata_router.META_ROUTER.
+_FAMILY_EXTS = {
+    "image":      ("jpg", "jpeg", "png", "gif", "bmp", "tiff", "tif",
+                   "webp", "ico", "svg", "xcf", "heic"),
+    "pdf":        ("pdf",),
+    "office":     ("docx", "doc", "xlsx", "xls", "pptx", "ppt",
+                   "odt", "ods", "odp", "rtf"),
+    "audio":      ("mp3", "wav", "flac", "ogg", "m4a", "aac", "wma"),
+    "video":      ("mp4", "mkv", "avi", "mov", "webm", "flv", "m4v", "wmv"),
+    "archive":    ("zip", "rar", "tar", "gz", "7z", "bz2", "xz", "iso"),
+    "exe":        ("exe", "dll", "sys", "msi", "bin", "elf", "so",
+                   "dylib", "pak", "dat", "sav"),
+    "code":       ("py", "pyi", "pyx", "js", "mjs", "ts", "html", "htm",
+                   "css", "scss", "java", "c", "h", "cpp", "hpp", "php",
+                   "rb", "go", "rs", "sh", "bash", "bat", "pl", "pm",
+                   "lua", "sql"),
+    "text":       ("txt", "md", "markdown", "rst", "json", "xml", "yaml",
+                   "yml", "toml", "ini", "cfg", "conf", "log", "sample"),
+    "data":       ("csv", "tsv", "parquet", "nc"),
+    "database":   ("sqlite", "db", "db3", "sqlite3", "mdb", "accdb"),
+    "3d":         ("obj", "stl", "fbx", "gltf", "glb", "ply", "step", "stp"),
+    "disk_image": ("img", "vhd", "vmdk", "dmg"),
+    "font":       ("ttf", "otf", "woff", "woff2", "eot"),
+}
+
+# Dict aplati figé (MappingProxyType : lecture seule, pas de copie)
+EXT_FAMILY = types.MappingProxyType({
+    sys.intern(ext): sys.intern(family)
+    for family, exts in _FAMILY_EXTS.items()
+    for ext in exts
+})
+
+# Cache extension brute -> normalisée internée : sur un arbre réel les
+# mêmes extensions reviennent des milliers de fois, autant ne payer
+# .lower() + intern qu'à la première rencontre de chaque variante
+_EXT_CACHE: dict[str, str] = {}
+
+
+def _decl_extension(filename: str) -> str | None:
+    """Extension déclarée normalisée (minuscules, internée), ou None."""
+    dot = filename.rfind(".")
+    if dot <= 0:
+        return None
+    raw = filename[dot + 1:]
+    ext = _EXT_CACHE.get(raw)
+    if ext is None:
+        ext = _EXT_CACHE.setdefault(raw, sys.intern(raw.lower()))
+    return ext
+
+# Taille des lots d'insertion : executemany amortit l'aller-retour
+# Python->SQLite et tous les lots partagent la même transaction
+# (un seul fsync au commit final, pas un par fichier)
+_BATCH_ROWS = 10000
+
+# Toutes les _COMMIT_ROWS lignes staged, on fusionne, committe et
+# checkpointe (PASSIVE) : le fichier -wal reste borné et un crash en
+# cours de scan ne perd que le chunk courant, pas tout le scan. Le
+# fsync reste des ordres de grandeur moins fréquent que par ligne.
+_COMMIT_ROWS = 50000
+
+_UPSERT_FILE_SQL = """
+    INSERT INTO file (path, folder_id, size_bytes, mtime, decl_extension, ext_family, hash_sha256)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET
+        folder_id      = excluded.folder_id,
+        size_bytes     = excluded.size_bytes,
+        mtime          = excluded.mtime,
+        decl_extension = excluded.decl_extension,
+        ext_family     = excluded.ext_family,
+        hash_sha256    = excluded.hash_sha256;
+"""
+
+# Diff-and-merge : les lignes scannées passent par une table temporaire
+# non indexée (insertion quasi gratuite), puis deux requêtes ensemblistes
+# font le tri. Un UPSERT par fichier écrirait des pages de journal même
+# quand RIEN n'a changé ; ici les fichiers inchangés coûtent zéro écriture.
+_STAGE_CREATE_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS scan_new (
+        path            TEXT,
+        folder_id       INTEGER,
+        size_bytes      INTEGER,
+        mtime           INTEGER,
+        decl_extension  TEXT,
+        ext_family      TEXT,
+        hash_sha256     TEXT
+    );
+"""
+
+# Insertion multi-VALUES plutôt qu'executemany : mesuré ~1,8x plus
+# rapide sur cette build (un step de statement pour 1000 lignes au lieu
+# d'un par ligne). 1000 lignes x 7 colonnes = 7000 paramètres, loin de
+# la limite (32 766 par défaut depuis SQLite 3.32 ; le diff-merge
+# demande déjà 3.33 pour UPDATE ... FROM).
+_VALUES_ROWS = 1000
+_STAGE_ROW_SQL = "(?, ?, ?, ?, ?, ?, ?)"
+_STAGE_INSERT_FULL_SQL = ("INSERT INTO scan_new VALUES "
+                          + ",".join([_STAGE_ROW_SQL] * _VALUES_ROWS))
+
+
+def _insert_stage(cur: sqlite3.Cursor, rows: list[tuple]) -> None:
+    """Insère `rows` dans scan_new par paquets multi-VALUES."""
+    for start in range(0, len(rows), _VALUES_ROWS):
+        chunk = rows[start:start + _VALUES_ROWS]
+        flat = [v for r in chunk for v in r]
+        if len(chunk) == _VALUES_ROWS:
+            cur.execute(_STAGE_INSERT_FULL_SQL, flat)
+        else:  # reliquat : statement taillé à la demande
+            cur.execute("INSERT INTO scan_new VALUES "
+                        + ",".join([_STAGE_ROW_SQL] * len(chunk)), flat)
+
+_DIFF_INSERT_SQL = """
+    INSERT INTO file (path, folder_id, size_bytes, mtime, decl_extension, ext_family, hash_sha256)
+    SELECT n.path, n.folder_id, n.size_bytes, n.mtime, n.decl_extension, n.ext_family, n.hash_sha256
+    FROM scan_new n
+    LEFT JOIN file f ON f.path = n.path
+    WHERE f.id IS NULL;
+"""
+
+# IS NOT plutôt que <> : les NULL (hash illisible, extension absente)
+# doivent compter comme des différences réelles
+_DIFF_UPDATE_SQL = """
+    UPDATE file SET
+        folder_id      = n.folder_id,
+        size_bytes     = n.size_bytes,
+        mtime          = n.mtime,
+        decl_extension = n.decl_extension,
+        ext_family     = n.ext_family,
+        hash_sha256    = n.hash_sha256
+    FROM scan_new n
+    WHERE file.path = n.path
+      AND (file.size_bytes IS NOT n.size_bytes
+           OR file.mtime IS NOT n.mtime
+           OR file.folder_id IS NOT n.folder_id
+           OR file.decl_extension IS NOT n.decl_extension
+           OR file.ext_family IS NOT n.ext_family
+           OR file.hash_sha256 IS NOT n.hash_sha256);
+"""
+
+
+# Hachage parallèle : hashlib relâche le GIL pendant h.update() sur des
+# blocs conséquents, donc des threads suffisent (I/O + SHA en parallèle)
+# pendant que l'écriture SQLite reste sur le thread principal.
+# 4 threads par cœur (plafonnés à 32) : une bonne partie du temps par
+# fichier est de l'attente I/O (open/read), pas du calcul
+_HASH_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+# Au-delà de cette taille, hachage via mmap : un seul appel C sur la
+# projection, zéro boucle de lecture côté Python
+_MMAP_HASH_THRESHOLD = 1024 * 1024
+
+
+def _new_digest():
+    """
+    Objet de hachage selon HASH_ALGO (repli silencieux sur SHA-256).
+    hashlib.sha256 passe déjà par _hashlib (OpenSSL EVP) quand CPython
+    est lié à OpenSSL — le dispatch SHA-NI se fait donc tout seul sur
+    les CPU qui ont l'extension, sans dépendance supplémentaire.
+    """
+    if HASH_ALGO == "blake3" and HAVE_BLAKE3:
+        return blake3.blake3(max_threads=blake3.AUTO)
+    return hashlib.sha256()
+
+
+# Hash des fichiers vides : constant, donc calculé une seule fois —
+# chaque fichier vide économise un open() + un appel de hachage
+_EMPTY_HASH = _new_digest().hexdigest()
+
+# Extensions de fichiers éphémères (téléchargements partiels, swap) :
+# contenu transitoire, le hacher n'apporte rien au dédoublon ni au
+# forensic et serait périmé au scan suivant. PAS "lock" : les lockfiles
+# de dépendances (poetry.lock, Cargo.lock, yarn.lock...) sont des vrais
+# contenus durables, et les verrous système visés sont des fichiers
+# vides déjà couverts par le raccourci taille zéro
+_SKIP_HASH_EXTS = frozenset(("tmp", "temp", "part", "partial",
+                             "crdownload", "swp"))
+
 
-def sha256_of_file(filepath: str, chunk_size: int = 8192) -> str:
-    """Calcule le hash SHA-256 d'un fichier (lecture par blocs)."""
-    h = hashlib.sha256()
+def sha256_of_file(filepath: str) -> str:
+    """
+    Calcule le hash d'identité d'un fichier (SHA-256, ou BLAKE3 si
+    HASH_ALGO le demande et que le paquet est installé).
+    Petits fichiers (l'écrasante majorité d'une arborescence) : un seul
+    read() + un seul appel de hachage, zéro boucle. Gros fichiers :
+    hachage du mmap en un appel, directement depuis le cache de pages,
+    avec hashlib.file_digest en repli si mmap échoue.
+    """
     with open(filepath, "rb") as f:
-        while True:
-            chunk = f.read(chunk_size)
-            if not chunk:
-                break
-            h.update(chunk)
-    return h.hexdigest()
+        if os.fstat(f.fileno()).st_size < _MMAP_HASH_THRESHOLD:
+            h = _new_digest()
+            h.update(f.read())
+            return h.hexdigest()
+
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                h = _new_digest()
+                h.update(mm)
+                return h.hexdigest()
+        except (OSError, ValueError):
+            pass  # mmap indisponible (FS exotique...) : repli lecture
 
+        return hashlib.file_digest(f, _new_digest).hexdigest()
 
-def get_or_create_folder(cur: sqlite3.Cursor, path: str, parent_id: int | None, subcount: int) -> int:
+
+def _hash_or_none(filepath: str) -> str | None:
+    """Variante tolérante pour les workers : None si fichier illisible."""
+    try:
+        return sha256_of_file(filepath)
+    except (OSError, PermissionError):
+        return None
+
+
+def _walk_entries(root: str, parent: str | None = None):
     """
-    Insère ou met à jour un dossier dans la table 'folder' et retourne son ID.
-    Gère la relation parent_id et le nombre de fichiers directs.
+    Parcours via os.scandir. Contrairement à os.walk qui jette ses
+    DirEntry (forçant un second syscall os.stat par fichier), on les
+    garde : entry.stat() réutilise les données déjà fournies par
+    getdents64, et entry.path évite un os.path.join par fichier.
+    Le chemin du parent est empilé avec chaque dossier : le consommateur
+    n'a aucun os.path.dirname à recalculer. Pile explicite plutôt que
+    récursion : pas de RecursionError sur les arbres très profonds.
+    Yield (chemin_dossier, chemin_parent, [DirEntry des fichiers]),
+    parents d'abord (None comme parent pour la racine du scan).
     """
+    stack = [(root, parent)]
+    while stack:
+        current, parent_path = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                subdirs = []
+                files = []
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            files.append(entry)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+        yield current, parent_path, files
+        # Empilés en ordre inverse pour conserver l'ordre de visite de
+        # la version récursive (premier sous-dossier traité en premier)
+        for sub in reversed(subdirs):
+            stack.append((sub, current))
+
+
+# RETURNING existe depuis SQLite 3.35 : détecté UNE fois à l'import au
+# lieu d'encaisser un try/except sqlite3.OperationalError par dossier
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_UPSERT_FOLDER_SQL = """
+    INSERT INTO folder (path, parent_id, files_subcount)
+    VALUES (?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET
+        parent_id = excluded.parent_id,
+        files_subcount = excluded.files_subcount
+"""
+
+_UPSERT_FOLDER_RETURNING_SQL = _UPSERT_FOLDER_SQL + " RETURNING id;"
+
+
+def _get_or_create_folder_returning(cur: sqlite3.Cursor, path: str,
+                                    parent_id: int | None, subcount: int) -> int:
+    """UPSERT du dossier avec RETURNING id : un seul aller-retour SQL."""
     # On normalise le chemin pour être sûr
     norm_path = os.path.abspath(path)
-    
-    # SQLite UPSERT pour insérer ou mettre à jour les infos du dossier
-    try:
-        cur.execute("""
-            INSERT INTO folder (path, parent_id, files_subcount)
-            VALUES (?, ?, ?)
-            ON CONFLICT(path) DO UPDATE SET
-                parent_id = excluded.parent_id,
-                files_subcount = excluded.files_subcount
-            RETURNING id;
-        """, (norm_path, parent_id, subcount))
-        
-        row = cur.fetchone()
-        if row:
-            return row[0]
-            
-    except sqlite3.OperationalError:
-        # Fallback pour les vieilles versions de SQLite qui ne supportent pas RETURNING
-        cur.execute("""
-            INSERT INTO folder (path, parent_id, files_subcount)
-            VALUES (?, ?, ?)
-            ON CONFLICT(path) DO UPDATE SET
-                parent_id = excluded.parent_id,
-                files_subcount = excluded.files_subcount
-        """, (norm_path, parent_id, subcount))
-
-    # Récupération de l'ID si pas retourné (ou fallback)
+
+    cur.execute(_UPSERT_FOLDER_RETURNING_SQL, (norm_path, parent_id, subcount))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    # Ne devrait pas arriver
+    raise ValueError(f"Impossible de récupérer l'ID pour le dossier : {norm_path}")
+
+
+def _get_or_create_folder_fallback(cur: sqlite3.Cursor, path: str,
+                                   parent_id: int | None, subcount: int) -> int:
+    """UPSERT muet puis relecture par chemin (SQLite < 3.35)."""
+    norm_path = os.path.abspath(path)
+
+    cur.execute(_UPSERT_FOLDER_SQL, (norm_path, parent_id, subcount))
     cur.execute("SELECT id FROM folder WHERE path = ?", (norm_path,))
     res = cur.fetchone()
     if res:
         return res[0]
-    else:
-        # Ne devrait pas arriver
-        raise ValueError(f"Impossible de récupérer l'ID pour le dossier : {norm_path}")
+    # Ne devrait pas arriver
+    raise ValueError(f"Impossible de récupérer l'ID pour le dossier : {norm_path}")
 
 
-def scan_folder_and_store(folder: str, db_path: str = DB_PATH) -> None:
-    """Scan récursivement `folder`, peuple la table 'folder' et stocke/maj les fichiers."""
-    conn = sqlite3.connect(db_path)
+# Liée une fois à l'import : la version de SQLite ne change pas en cours
+# de process, inutile de re-brancher (ou de re-tester) à chaque dossier
+get_or_create_folder = (_get_or_create_folder_returning if _HAS_RETURNING
+                        else _get_or_create_folder_fallback)
+
+
+def scan_folder_and_store(folder: str, db_path: str = DB_PATH, build_indexes: bool = True) -> None:
+    """
+    Scan récursivement `folder`, peuple la table 'folder' et stocke/maj les fichiers.
+    build_indexes=False sert aux bases de staging (la fusion se fait avant les index).
+    """
+    # isolation_level=None : autocommit, aucun BEGIN implicite inséré
+    # par le module sqlite3 avant chaque DML — on gère la transaction
+    # explicitement nous-mêmes (PRAGMAs hors transaction, un seul
+    # BEGIN IMMEDIATE qui prend le verrou écrivain d'emblée)
+    conn = sqlite3.connect(db_path, isolation_level=None)
     cur = conn.cursor()
-    
+
     # Activation des clés étrangères pour la cohérence
     cur.execute("PRAGMA foreign_keys = ON;")
 
+    # PRAGMAs orientés écriture en masse : WAL est persistant mais
+    # synchronous/temp_store/mmap/cache sont par connexion, donc à
+    # refaire ici même si db_init les a déjà posés
+    cur.execute("PRAGMA journal_mode = WAL;")
+    cur.execute("PRAGMA synchronous = NORMAL;")
+    cur.execute("PRAGMA temp_store = MEMORY;")
+    cur.execute("PRAGMA mmap_size = 1073741824;")     # lecture des pages via mmap (1 Go max)
+    cur.execute("PRAGMA cache_size = -131072;")       # 128 Mo, aligné sur init_db
+    cur.execute("PRAGMA wal_autocheckpoint = 10000;") # checkpoints moins fréquents pendant le burst
+
     # Cache pour éviter de requêter la DB pour chaque parent_id
     # format: { chemin_absolu_dossier: folder_id }
     folder_cache = {}
 
+    # Les hashs stockés ne sont réutilisables que s'ils viennent du même
+    # algorithme que celui actif : sur mismatch (y compris la sentinelle
+    # d'une migration interrompue), on re-hache TOUT — sinon les requêtes
+    # de doublons mélangeraient deux formats sans pouvoir le détecter
+    algo_code = _HASH_ALGO_CODES[_EFFECTIVE_ALGO]
+    db_code = cur.execute("PRAGMA user_version;").fetchone()[0]
+    reuse_hashes = db_code == algo_code or (db_code == 0 and algo_code == 1)
+
+    # Empreintes déjà en base, préchargées en un seul scan (bien moins
+    # cher que N SELECT ponctuels) : un fichier dont (taille, mtime)
+    # n'a pas bougé réutilise son hash stocké sans relire un octet
+    known_files: dict[str, tuple] = {}
+    if reuse_hashes:
+        known_files = {
+            path: (size_bytes, mtime, hash_sha256)
+            for path, size_bytes, mtime, hash_sha256 in cur.execute(
+                "SELECT path, size_bytes, mtime, hash_sha256 FROM file"
+            )
+        }
+
+    abs_scan_root = os.path.abspath(folder)
+
+    # Tampon de lignes fichier : flush par executemany toutes les
+    # _BATCH_ROWS lignes, le tout dans une seule transaction
+    rows: list[tuple] = []
+
+    # Métadonnées + future de hachage, collectées pendant le parcours :
+    # chaque fichier modifié est soumis au pool dès sa découverte, donc
+    # traversée, hachage et écriture SQLite se recouvrent au lieu de
+    # s'enchaîner en phases
+    meta: list[tuple] = []
+
+    # Lignes staged depuis le dernier commit intermédiaire
+    staged = 0
+
+    def _flush_batch() -> None:
+        """Vide `rows` vers le staging ; commit + checkpoint par chunk."""
+        nonlocal staged
+        _insert_stage(cur, rows)
+        staged += len(rows)
+        rows.clear()
+
+        if staged >= _COMMIT_ROWS:
+            cur.execute(_DIFF_INSERT_SQL)
+            cur.execute(_DIFF_UPDATE_SQL)
+            cur.execute("DELETE FROM scan_new;")
+            cur.execute("COMMIT;")
+            # Recopie les pages du -wal vers la base sans bloquer les
+            # lecteurs, pour que le -wal ne grossisse pas sans borne
+            cur.execute("PRAGMA wal_checkpoint(PASSIVE);")
+            cur.execute("BEGIN IMMEDIATE;")
+            staged = 0
+
+    # Pool créé avant le parcours : les hachages démarrent pendant que
+    # la traversée continue (scandir est surtout de l'attente syscall,
+    # hashlib relâche le GIL — les deux se recouvrent bien)
+    pool = ThreadPoolExecutor(max_workers=_HASH_WORKERS)
+
+    try:
+        # Verrou écrivain pris tout de suite : pas d'upgrade
+        # SHARED->RESERVED qui peut échouer en cours de route
+        cur.execute("BEGIN IMMEDIATE;")
+
+        # Table de staging temporaire (détruite avec la connexion) ;
+        # temp_store = MEMORY ci-dessus la garde entièrement en RAM
+        cur.execute(_STAGE_CREATE_SQL)
+
+        # Migration d'algorithme : la sentinelle part avec le premier
+        # commit intermédiaire, AVANT tout hash du nouveau format — une
+        # interruption laisse donc une base qui ne sera jamais réutilisée
+        # telle quelle (échec avant tout commit : rollback, ancienne
+        # étiquette et anciens hashs intacts)
+        if db_code != algo_code:
+            cur.execute(f"PRAGMA user_version = {_ALGO_MIGRATING};")
+
+        for current_path, parent_path, entries in _walk_entries(abs_scan_root):
+            # current_path est déjà absolu (dérivé de abs_scan_root)
+
+            # 1. Gestion du Dossier (Table folder)
+            # -----------------------------------
+
+            # Le parent vient de la récursion (parents d'abord) : son id
+            # est forcément déjà dans le cache, sauf pour la racine du
+            # scan qui n'a pas de parent connu
+            parent_id = folder_cache.get(parent_path) if parent_path is not None else None
+
+            # Insertion / Maj du dossier actuel
+            folder_id = get_or_create_folder(cur, current_path, parent_id, len(entries))
+            folder_cache[current_path] = folder_id
+
+            # 2. Gestion des Fichiers (Table file)
+            # ------------------------------------
+            for entry in entries:
+                full_path = entry.path
+                filename = entry.name
+
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+
+                size_bytes = st.st_size
+                mtime = int(st.st_mtime)
+
+                # Extension via rfind sur le nom seul (splitext rescanne
+                # toute la string) ; sys.intern fait partager une même
+                # string Python aux extensions répétées sur tout l'arbre
+                decl_extension = _decl_extension(filename)
+                ext_family = EXT_FAMILY.get(decl_extension) if decl_extension else None
+
+                # Fichier inchangé (taille + mtime) : hash réutilisé,
+                # pas de relecture ; le diff final décidera s'il y a
+                # quoi que ce soit à réécrire (en général : rien)
+                prev = known_files.get(full_path)
+                if prev is not None and prev[0] == size_bytes and prev[1] == mtime and prev[2]:
+                    rows.append((full_path, folder_id, size_bytes, mtime,
+                                 decl_extension, ext_family, prev[2]))
+                    if len(rows) >= _BATCH_ROWS:
+                        _flush_batch()
+                elif size_bytes == 0:
+                    # Hash connu d'avance : pas d'open(), pas de hachage
+                    rows.append((full_path, folder_id, size_bytes, mtime,
+                                 decl_extension, ext_family, _EMPTY_HASH))
+                    if len(rows) >= _BATCH_ROWS:
+                        _flush_batch()
+                elif decl_extension in _SKIP_HASH_EXTS:
+                    # Fichier éphémère : enregistré sans hash
+                    rows.append((full_path, folder_id, size_bytes, mtime,
+                                 decl_extension, ext_family, None))
+                    if len(rows) >= _BATCH_ROWS:
+                        _flush_batch()
+                else:
+                    meta.append((full_path, folder_id, size_bytes, mtime,
+                                 decl_extension, ext_family,
+                                 pool.submit(_hash_or_none, full_path)))
+
+        # 3. Récolte des hachages + écriture (thread principal unique)
+        # ------------------------------------------------------------
+        # Les threads ne font QUE hacher ; toutes les écritures SQLite
+        # restent ici, donc un seul écrivain (pas de contention de
+        # verrou). L'ordre de soumission est conservé : result() rend
+        # la main aux threads tant que le hash n'est pas prêt.
+        for (full_path, folder_id, size_bytes, mtime,
+             decl_extension, ext_family, fut) in meta:
+            rows.append((full_path, folder_id, size_bytes, mtime,
+                         decl_extension, ext_family, fut.result()))
+
+            if len(rows) >= _BATCH_ROWS:
+                _flush_batch()
+
+        # Flush du reliquat, puis fusion ensembliste du dernier chunk :
+        # les requêtes de diff couvrent créations et modifications, et
+        # les fichiers inchangés ne touchent aucune page de la table file
+        if rows:
+            _insert_stage(cur, rows)
+        cur.execute(_DIFF_INSERT_SQL)
+        cur.execute(_DIFF_UPDATE_SQL)
+        # L'étiquette définitive ne remplace la sentinelle que dans la
+        # transaction finale : elle n'existe en base qu'une fois TOUS
+        # les hashs du nouveau format commités
+        if db_code != algo_code:
+            cur.execute(f"PRAGMA user_version = {algo_code};")
+        cur.execute("COMMIT;")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.shutdown(cancel_futures=True)
+        cur.close()
+        conn.close()
+
+    # Index posés APRÈS le chargement : construction en un seul scan
+    # trié au lieu d'une maintenance de B-tree par INSERT (idempotent)
+    if build_indexes:
+        create_indexes(db_path)
+
+
+# ------------------------------------------------------------------
+# Scan parallèle : staging par worker + fusion ATTACH
+# ------------------------------------------------------------------
+
+# SQL de fusion d'une base de staging attachée sous le nom 'stage'.
+# Les ids de staging sont locaux : le recâblage folder_id/parent_id se
+# fait par jointure sur les chemins (UNIQUE des deux côtés).
+_MERGE_FOLDERS_SQL = """
+    INSERT INTO folder (path, files_subcount)
+    SELECT path, files_subcount FROM stage.folder WHERE true
+    ON CONFLICT(path) DO UPDATE SET files_subcount = excluded.files_subcount;
+"""
+
+_MERGE_REPARENT_SQL = """
+    UPDATE folder SET parent_id = (
+        SELECT mp.id
+        FROM stage.folder sf
+        JOIN stage.folder sp ON sf.parent_id = sp.id
+        JOIN folder mp ON mp.path = sp.path
+        WHERE sf.path = folder.path
+    )
+    WHERE path IN (SELECT path FROM stage.folder);
+"""
+
+_MERGE_FILES_SQL = """
+    INSERT INTO file (path, folder_id, size_bytes, mtime, decl_extension, ext_family, hash_sha256)
+    SELECT sf.path, mf.id, sf.size_bytes, sf.mtime, sf.decl_extension, sf.ext_family, sf.hash_sha256
+    FROM stage.file sf
+    LEFT JOIN stage.folder sfo ON sf.folder_id = sfo.id
+    LEFT JOIN folder mf ON mf.path = sfo.path
+    WHERE true
+    ON CONFLICT(path) DO UPDATE SET
+        folder_id      = excluded.folder_id,
+        size_bytes     = excluded.size_bytes,
+        mtime          = excluded.mtime,
+        decl_extension = excluded.decl_extension,
+        ext_family     = excluded.ext_family,
+        hash_sha256    = excluded.hash_sha256;
+"""
+
+
+def _scan_subtree_to_stage(subtree: str, stage_path: str) -> str:
+    """Worker : scanne `subtree` dans sa base de staging privée (sans index)."""
+    init_db(stage_path)
+    scan_folder_and_store(subtree, stage_path, build_indexes=False)
+    return stage_path
+
+
+def scan_folder_parallel(folder: str, db_path: str = DB_PATH, workers: int | None = None) -> None:
+    """
+    Variante parallèle de scan_folder_and_store : un process par
+    sous-dossier de premier niveau, chacun écrivant dans SA base de
+    staging (zéro contention d'écrivain), puis fusion séquentielle via
+    ATTACH dans la base principale. Les index sont créés après fusion.
+    """
     abs_scan_root = os.path.abspath(folder)
+    subtrees = [e.path for e in os.scandir(abs_scan_root) if e.is_dir(follow_symlinks=False)]
+    workers = workers or os.cpu_count() or 1
+
+    # Pas assez de sous-arbres pour amortir les process : chemin classique
+    if len(subtrees) < 2 or workers < 2:
+        scan_folder_and_store(folder, db_path)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="locard_stage_") as stage_dir:
+        stage_paths = [os.path.join(stage_dir, f"stage_{i}.db") for i in range(len(subtrees))]
 
-    for root, dirs, files in os.walk(abs_scan_root):
-        current_path = os.path.abspath(root)
-        
-        # 1. Gestion du Dossier (Table folder)
-        # -----------------------------------
-        
-        # Recherche du parent_id
-        parent_path = os.path.dirname(current_path)
-        parent_id = None
-        
-        # Si ce n'est pas la racine absolue du système ou du scan, on cherche le parent
-        if current_path != abs_scan_root:
-            # Essai via le cache
-            parent_id = folder_cache.get(parent_path)
-            
-            # Si pas dans le cache (ex: parent hors du dossier de scan ou scan partiel), on tente la DB
-            if parent_id is None:
-                res = cur.execute("SELECT id FROM folder WHERE path = ?", (parent_path,)).fetchone()
+        with multiprocessing.Pool(min(workers, len(subtrees))) as pool:
+            pool.starmap(_scan_subtree_to_stage, zip(subtrees, stage_paths))
+
+        # Fusion séquentielle des stagings dans la base principale
+        conn = sqlite3.connect(db_path)
+        cur = conn.cursor()
+        cur.execute("PRAGMA journal_mode = WAL;")
+        cur.execute("PRAGMA synchronous = NORMAL;")
+        # Les workers hachent toujours tout depuis zéro avec l'algorithme
+        # actif, mais chaque fusion de staging est commitée séparément :
+        # en migration, la sentinelle est posée AVANT la première, et
+        # l'étiquette définitive n'arrive qu'avec le commit final — une
+        # fusion interrompue force donc un re-hachage complet au lieu de
+        # laisser cohabiter les deux formats sous une étiquette valide
+        algo_code = _HASH_ALGO_CODES[_EFFECTIVE_ALGO]
+        db_code = cur.execute("PRAGMA user_version;").fetchone()[0]
+        if db_code != algo_code:
+            cur.execute(f"PRAGMA user_version = {_ALGO_MIGRATING};")
+            conn.commit()
+        try:
+            for stage_path in stage_paths:
+                cur.execute("ATTACH DATABASE ? AS stage;", (stage_path,))
+                cur.execute(_MERGE_FOLDERS_SQL)
+                cur.execute(_MERGE_REPARENT_SQL)
+                cur.execute(_MERGE_FILES_SQL)
+                conn.commit()
+                cur.execute("DETACH DATABASE stage;")
+
+            # Dossier racine + fichiers directement à la racine
+            root_entries = [e for e in os.scandir(abs_scan_root) if e.is_file(follow_symlinks=False)]
+            root_id = get_or_create_folder(cur, abs_scan_root, None, len(root_entries))
+
+            rows = []
+            for entry in root_entries:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                decl_extension = _decl_extension(entry.name)
+                ext_family = EXT_FAMILY.get(decl_extension) if decl_extension else None
+                if st.st_size == 0:
+                    file_hash = _EMPTY_HASH
+                elif decl_extension in _SKIP_HASH_EXTS:
+                    file_hash = None
+                else:
+                    file_hash = _hash_or_none(entry.path)
+                rows.append((entry.path, root_id, st.st_size, int(st.st_mtime),
+                             decl_extension, ext_family, file_hash))
+            if rows:
+                cur.executemany(_UPSERT_FILE_SQL, rows)
+
+            # Les racines de sous-arbres n'avaient pas de parent dans
+            # leur staging : recâblage par dirname
+            for fid, fpath in cur.execute(
+                "SELECT id, path FROM folder WHERE parent_id IS NULL AND path != ?",
+                (abs_scan_root,),
+            ).fetchall():
+                res = cur.execute(
+                    "SELECT id FROM folder WHERE path = ?", (os.path.dirname(fpath),)
+                ).fetchone()
                 if res:
-                    parent_id = res[0]
-                    folder_cache[parent_path] = parent_id # Mise en cache
-
-        # Insertion / Maj du dossier actuel
-        folder_id = get_or_create_folder(cur, current_path, parent_id, len(files))
-        folder_cache[current_path] = folder_id
-
-        # 2. Gestion des Fichiers (Table file)
-        # ------------------------------------
-        for filename in files:
-            full_path = os.path.join(root, filename)
-
-            try:
-                st = os.stat(full_path)
-            except OSError:
-                continue
-
-            size_bytes = st.st_size
-            mtime = int(st.st_mtime)
-
-            _, ext = os.path.splitext(filename)
-            decl_extension = ext.lower().lstrip(".") if ext else None
-
-            # Calcul du hash (optionnel selon perf, mais présent dans ton code original)
-            try:
-                hash_sha256 = sha256_of_file(full_path)
-            except (OSError, PermissionError):
-                hash_sha256 = None
-
-            cur.execute("""
-                INSERT INTO file (path, folder_id, size_bytes, mtime, decl_extension, hash_sha256)
-                VALUES (?, ?, ?, ?, ?, ?)
-                ON CONFLICT(path) DO UPDATE SET
-                    folder_id      = excluded.folder_id,
-                    size_bytes     = excluded.size_bytes,
-                    mtime          = excluded.mtime,
-                    decl_extension = excluded.decl_extension,
-                    hash_sha256    = excluded.hash_sha256;
-            """, (full_path, folder_id, size_bytes, mtime, decl_extension, hash_sha256))
-
-    conn.commit()
-    conn.close()
+                    cur.execute("UPDATE folder SET parent_id = ? WHERE id = ?", (res[0], fid))
+
+            if db_code != algo_code:
+                cur.execute(f"PRAGMA user_version = {algo_code};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    create_indexes(db_path)
 
 
 if __name__ == "__main__":